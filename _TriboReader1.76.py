@@ -1,16 +1,60 @@
 # Importy modułów standardowych
+import io
 import re
 import os
+import csv
 import sys
+import glob
+import json
+import queue
+import mmap
 import time
-import shutil
 import ctypes
-import msvcrt
+import shutil
+import hashlib
+import argparse
 import traceback
+import contextlib
+import tracemalloc
 import configparser
-# Importy modułów zewnętrznych
-import pandas as pd
-from scipy.signal import savgol_filter
+import multiprocessing
+import concurrent.futures
+if os.name == "nt": # Konsola Windows (odliczanie do zamknięcia)
+    import msvcrt
+
+# Wersja programu (także część klucza pamięci podręcznej wyników)
+__version__ = "1.76"
+
+# Importy modułów zewnętrznych - ładowane przy pierwszym użyciu, aby start programu, wczytanie configu
+# i wyszukanie plików nie czekały na import numpy i pandas (scipy i xlsxwriter importowane w funkcjach)
+# (atrybuty pośrednika z przedrostkiem _lazy_, aby nie przesłaniały atrybutów modułu, np. np.load)
+class LazyModule:
+    def __init__(self, name, load):
+        self._lazy_name = name # Nazwa zmiennej globalnej modułu
+        self._lazy_load = load # Funkcja z instrukcją import (widoczną dla pyinstaller)
+
+    def __getattr__(self, attribute):
+        module = self._lazy_load()
+        globals()[self._lazy_name] = module # Kolejne odwołania bezpośrednio do modułu
+        return getattr(module, attribute)
+
+def import_numpy():
+    import numpy
+    return numpy
+
+def import_pandas():
+    import pandas
+    return pandas
+
+np = LazyModule("np", import_numpy)
+pd = LazyModule("pd", import_pandas)
+
+# Import wszystkich modułów zewnętrznych od razu (np. przed pomiarem etapów, aby nie wliczać czasu importu)
+def import_modules():
+    import scipy.signal
+    import xlsxwriter
+    np.ndarray # Pierwsze odwołanie ładuje moduł
+    pd.DataFrame
 
 # Aby uruchomić program należy najpierw zainstalować pythona 3.11 lub nowszego i doinstalować trzy biblioteki:
 # pip install pandas xlsxwriter scipy
@@ -24,7 +68,7 @@ from scipy.signal import savgol_filter
 def load_config(file_name):
     config = configparser.ConfigParser()
     config.read(file_name)
-    settings = config["Settings"]
+    settings = config["Settings"] if config.has_section("Settings") else {} # Brak pliku - wartości domyślne
     return {
         "offset_raw": int(settings.get("offset_raw", 1)),
         "title_from_text": int(settings.get("title_from_text", 1)),
@@ -34,7 +78,18 @@ def load_config(file_name):
         "default_window_length_pd": int(settings.get("default_window_length_pd", 5)),
         "min_sample": int(settings.get("min_sample", 100)),
         "max_sample": int(settings.get("max_sample", 110)),
-        "chart_lang": settings.get("chart_lang", "en")
+        "chart_lang": settings.get("chart_lang", "en"),
+        "workers": int(settings.get("workers", 0)), # Liczba procesów, 0 - wszystkie rdzenie procesora
+        "keep_csv": int(settings.get("keep_csv", 0)), # Zachowanie plików CSV każdego pliku (1 - tak, 0 - nie)
+        "stream_raw_xlsx": int(settings.get("stream_raw_xlsx", 0)), # Zapis strumieniowy plików xlsx z danymi RAW (1 - tak, 0 - nie)
+        "chart_points": int(settings.get("chart_points", 0)), # Maksymalna liczba punktów serii RAW na wykresie, 0 - wszystkie
+        "cache": int(settings.get("cache", 0)), # Pamięć podręczna wyników (1 - tak, 0 - pomiń, 2 - wyczyść i utwórz od nowa)
+        "cache_size_mb": int(settings.get("cache_size_mb", 1024)), # Maksymalny rozmiar pamięci podręcznej w MB
+        "watch": int(settings.get("watch", 0)), # Obserwowanie folderu i obróbka nowych lub zmienionych plików (1 - tak, 0 - nie)
+        "watch_interval": float(settings.get("watch_interval", 2)), # Odstęp sprawdzania folderu w sekundach
+        "export_arrays": int(settings.get("export_arrays", 0)), # Zapis wyników każdego pliku do _arrays (.npy, .parquet z pyarrow) (1 - tak, 0 - nie)
+        "progress": int(settings.get("progress", 1)), # Pasek postępu obróbki w konsoli (1 - tak, 0 - nie)
+        "profile": int(settings.get("profile", 0)) # Pomiar etapów obróbki, zapis profile_trace.json (1 - czas, 2 - czas i pamięć (wolniej), 0 - nie)
     }
 
 # Get variables from user
@@ -78,40 +133,86 @@ def ask_user_for_variables():
     return min_sample, max_sample, default_window_length_u, default_window_length_pd, title_from_text, offset_raw, erase_peak, invert_peak, chart_lang
 
 # Apply Savitzky–Golay filter to 'µ' and 'pd', leave intact first averaged data value
-def Savitzky(averaged_data, column_name, default_window_length):
+def Savitzky(values, default_window_length):
     """
-    Funkcja do zastosowania filtra Savitzky-Golaya na jednej kolumnie.
+    Funkcja do zastosowania filtra Savitzky-Golaya na jednej kolumnie danych.
 
     Parameters:
-    - averaged_data: DataFrame, dane wejściowe.
-    - column_name: str, nazwa kolumny do przefiltrowania.
+    - values: np.ndarray, dane wejściowe (uśredniona kolumna).
     - default_window_length: int, domyślna długość okna dla filtra.
 
     Returns:
-    - DataFrame z zastosowanym filtrem dla wskazanej kolumny.
+    - np.ndarray z zastosowanym filtrem, pierwsza wartość bez zmian.
     """
-    if column_name not in averaged_data:
-        raise ValueError(f"[ERROR] Kolumna '{column_name}' nie istnieje w danych.")
     # Oblicz maksymalną dopuszczalną długość okna
-    max_window_length = (len(averaged_data) // 2) * 2 - 1  # Upewnij się, że jest nieparzysta
+    max_window_length = (len(values) // 2) * 2 - 1  # Upewnij się, że jest nieparzysta
     # Użyj minimalnej z podanej i maksymalnej długości
     window_length = min(default_window_length, max_window_length)
     # Upewnij się, że długość okna jest nieparzysta
     if window_length % 2 == 0:
         window_length += 1
-    # Zachowaj pierwszą wartość kolumny
-    first_value = averaged_data.at[0, column_name]
     # Zastosuj filtr
-    averaged_data[column_name] = savgol_filter(averaged_data[column_name], window_length, polyorder=2)
+    from scipy.signal import savgol_filter # Import przy pierwszym użyciu (długi import scipy)
+    filtered = savgol_filter(values, window_length, polyorder=2)
     # Przywróć pierwszą wartość
-    averaged_data.at[0, column_name] = first_value
+    filtered[0] = values[0]
 
-    return averaged_data
+    return filtered
 
 # Funkcja konwertuje przebieg 'µ' z pseudo-sinusoidalnego / prostokątnego na liniowy
 # Za pomocą 'Linear Position [mm]' wyznacza odcinki ruchu posuwisto-zwrotnego (linear) [opcjonalnie]
 # Tam gdzie była zmiana kierunku zmienia znak i usuwa próbki gdzie ruch ustał lub rósł dopiero
 # Po usunięciu aproksymuje te próbki bazując na średniej z dwóch danych przed i po usunięciu
+def cut_windows_mask(length, centers, widths):
+    # Maska okien [środek - szerokość, środek + szerokość] przycięta do zakresu danych
+    # (tablica różnicowa zamiast przypisania dla każdego okna osobno)
+    starts = np.maximum(centers - widths, 0)
+    ends = np.minimum(centers + widths, length - 1)
+    diff = np.zeros(length + 1, dtype=np.int64)
+    np.add.at(diff, starts, 1)
+    np.add.at(diff, ends + 1, -1)
+    # Liczba wyciętych wierszy liczona jak w oryginale - z nakładaniem okien
+    return np.cumsum(diff[:-1]) > 0, int((ends - starts + 1).sum())
+
+def interpolate_cut_gaps(values):
+    # Aproksymacja liniowa wyciętych przedziałów (NaN) na podstawie średnich z 2 próbek przed i po.
+    # Wynik identyczny z dawną pętlą po wierszach: pierwszy NaN przedziału daje rampę od
+    # poprzedniej do następnej ważnej próbki, każdy kolejny NaN ponownie wygładza 3 punkty
+    # wokół siebie (na bieżących wartościach), przedziały na początku i końcu bez zmian.
+    length = len(values)
+    edges = np.diff(np.concatenate(([0], np.isnan(values).view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    filled = values.tolist()
+
+    def mean_valid(first, last):
+        # Średnia jak pandas .mean() - z pominięciem NaN
+        total = 0.0
+        count = 0
+        for value in filled[first:last + 1]:
+            if value == value:
+                total += value
+                count += 1
+        return total / count
+
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if start == 0 or end == length - 1:
+            continue
+        prev_idx, next_idx = start - 1, end + 1
+        pre_values = mean_valid(max(0, prev_idx - 1), prev_idx)
+        post_values = mean_valid(next_idx, min(next_idx + 1, length - 1))
+        num_points = next_idx - prev_idx
+        filled[prev_idx:next_idx + 1] = (
+            pre_values + (post_values - pre_values) * (np.arange(num_points + 1) / num_points)
+        ).tolist()
+        for idx in range(start + 1, end + 1):
+            pre_values = mean_valid(max(0, idx - 2), idx - 1)
+            post_values = mean_valid(idx + 1, min(idx + 2, length - 1))
+            filled[idx - 1] = pre_values + (post_values - pre_values) * 0.0
+            filled[idx] = pre_values + (post_values - pre_values) * 0.5
+            filled[idx + 1] = pre_values + (post_values - pre_values) * 1.0
+    return np.array(filled, dtype=np.float64)
+
 def linear_mode_u_preprocessing(df):
     # Ustawienia
     default_sampling_percent = 0.004  # Domyślnie 0.4% próbek
@@ -124,28 +225,21 @@ def linear_mode_u_preprocessing(df):
     lm_cut = "Liczba wyciętych próbek:"
     lm_per_sample = "próbek na zmianę znaku:"
     # String END
+    # Pozycje zmian znaku w 'µ' (iloczyn sąsiednich próbek < 0)
+    µ_values = df['µ'].to_numpy(dtype=np.float64)
+    µ_changes = np.flatnonzero(µ_values[:-1] * µ_values[1:] < 0) + 1
     if support_column in df.columns:
-        linear_positions = df[support_column]
-        changes_linear = (linear_positions.shift() * linear_positions < 0).cumsum()
-        # Zabezpieczenie fluktuacji i obliczanie przesunięcia w 'µ'
-        changes_µ = []
-        for idx in df.index:
-            if idx == 0:
-                continue
-            if linear_positions.shift()[idx] * linear_positions[idx] < 0:
-                # Synchronizacja zmiany znaku w 'µ'
-                sign_change_found = False
-                rows_after_linear_change = 0
-                for i in range(idx, len(df)):
-                    if df['µ'].shift()[i] * df['µ'][i] < 0:
-                        sign_change_found = True
-                        rows_after_linear_change = i - idx
-                        break
-                if sign_change_found:
-                    changes_µ.append((idx, rows_after_linear_change))
+        linear_positions = df[support_column].to_numpy(dtype=np.float64)
+        linear_changes = np.flatnonzero(linear_positions[:-1] * linear_positions[1:] < 0) + 1
+        linear_count = len(linear_changes)
+        # Synchronizacja: najbliższa zmiana znaku w 'µ' od zmiany kierunku (włącznie)
+        nearest = np.searchsorted(µ_changes, linear_changes, side='left')
+        found = nearest < len(µ_changes)
+        changes_µ = linear_changes[found]
+        delays = µ_changes[nearest[found]] - changes_µ
         # SAFE: avoid division by zero
         denom1 = len(changes_µ)
-        denom2 = changes_linear.iloc[-1] if len(changes_linear) > 0 else 0
+        denom2 = linear_count
         cond_safety = False
         if denom1 == 0 or denom2 == 0:
             cond_safety = True
@@ -156,13 +250,9 @@ def linear_mode_u_preprocessing(df):
             df['µ'] = df['µ'].abs() # ABS wartości w kolumnie 'µ'
             print(lm_warning)
         else:
-            # Wycinanie danych na podstawie obliczonego przesunięcia
-            for change_idx, delay in changes_µ:
-                cut_range = delay # Zakres wycięcia w obie strony
-                start_idx = max(0, change_idx - cut_range)
-                end_idx = min(len(df) - 1, change_idx + cut_range)
-                df.loc[start_idx:end_idx, 'µ'] = None
-                max_rows_to_cut += (end_idx - start_idx + 1)
+            # Wycinanie danych na podstawie obliczonego przesunięcia (zakres w obie strony)
+            cut_mask, max_rows_to_cut = cut_windows_mask(len(df), changes_µ, delays)
+            df['µ'] = df['µ'].mask(cut_mask)
             # Upewnij się, że w zerowej linii 'µ' jest wartość 0
             if df.loc[0, 'µ'] != 0:
                 # Przesuń wartości w kolumnie 'µ' w dół o 1
@@ -171,8 +261,8 @@ def linear_mode_u_preprocessing(df):
                 df.loc[0, 'µ'] = 0
     else:
         # Brak 'Linear Position [mm]' - obliczanie zmian znaku w 'µ'
-        changes_µ = changes_linear = (df['µ'].shift() * df['µ'] < 0).cumsum()
-        denom = changes_µ.iloc[-1] if len(changes_µ) > 0 else 0
+        changes_µ = µ_changes
+        denom = len(changes_µ)
         cond_safety = False
         if denom == 0:
             cond_safety = True
@@ -184,22 +274,19 @@ def linear_mode_u_preprocessing(df):
             print(lm_warning)
         else:
             # Wycinanie danych wokół zmian znaku
-            for change_idx in changes_µ.index[df['µ'].shift() * df['µ'] < 0]:
-                num_samples = int(len(df) * default_sampling_percent)
-                start_idx = max(0, change_idx - num_samples)
-                end_idx = min(len(df) - 1, change_idx + num_samples)
-                df.loc[start_idx:end_idx, 'µ'] = None
-                max_rows_to_cut += (end_idx - start_idx + 1)
+            num_samples = int(len(df) * default_sampling_percent)
+            cut_mask, max_rows_to_cut = cut_windows_mask(len(df), changes_µ, num_samples)
+            df['µ'] = df['µ'].mask(cut_mask)
     # Naprawa drugiego warunku warunkując wyliczenie w całości oraz test na 0
     check_condition = False
     if support_column in df.columns:
-        denom = changes_linear.iloc[-1] if len(changes_linear) > 0 else 0
+        denom = linear_count
         if denom == 0:
             check_condition = False
         else:
             check_condition = not (round(len(df) / denom) < 3)
     else:
-        denom = changes_µ.iloc[-1] if len(changes_µ) > 0 else 0
+        denom = len(changes_µ)
         if denom == 0:
             check_condition = False
         else:
@@ -208,31 +295,16 @@ def linear_mode_u_preprocessing(df):
         # ABS wartości w kolumnie 'µ'
         df['µ'] = df['µ'].abs()
         # Aproksymacja liniowa z użyciem średnich próbek przed i po
-        for idx, row in df.iterrows():
-            if pd.isna(row['µ']):
-                # Znajdź przedział do aproksymacji
-                prev_idx = df.loc[:idx - 1, 'µ'].last_valid_index()
-                next_idx = df.loc[idx + 1:, 'µ'].first_valid_index()
-                if prev_idx is not None and next_idx is not None:
-                    # Oblicz wartości średnie przed i po wycięciu
-                    pre_values = df.loc[max(0, prev_idx - 1):prev_idx, 'µ'].mean()
-                    post_values = df.loc[next_idx:min(next_idx + 1, len(df) - 1), 'µ'].mean()
-                    # Aproksymacja liniowa na podstawie średnich wartości
-                    num_points = next_idx - prev_idx
-                    df.loc[prev_idx:next_idx, 'µ'] = pd.Series(
-                        [pre_values + (post_values - pre_values) * (i / num_points)
-                        for i in range(num_points + 1)],
-                        index=range(prev_idx, next_idx + 1)
-                    )
+        df['µ'] = interpolate_cut_gaps(df['µ'].to_numpy(dtype=np.float64))
     if max_rows_to_cut > 0:
         if support_column in df.columns:
-            print(f"{lm_count} {len(changes_µ)}, {changes_linear.iloc[-1]}")
+            print(f"{lm_count} {len(changes_µ)}, {linear_count}")
             if len(changes_µ) != 0 and (round(len(df)/len(changes_µ)) > 3):
                 print(f"{lm_cut} {max_rows_to_cut}, {lm_per_sample} {round(max_rows_to_cut/len(changes_µ))}")
         else:
-            print(f"{lm_count} {changes_µ.iloc[-1]}")
-            if changes_µ.iloc[-1] != 0 and (round(len(df)/changes_µ.iloc[-1]) > 3):
-                print(f"{lm_cut} {max_rows_to_cut}, {lm_per_sample} {round(max_rows_to_cut/changes_µ.iloc[-1])}")
+            print(f"{lm_count} {len(changes_µ)}")
+            if len(changes_µ) != 0 and (round(len(df)/len(changes_µ)) > 3):
+                print(f"{lm_cut} {max_rows_to_cut}, {lm_per_sample} {round(max_rows_to_cut/len(changes_µ))}")
 
     return df
 
@@ -242,14 +314,15 @@ def replace_repeated_values(column, percent=0.1):
     Funkcja usuwa wartości w kolumnie, które powtarzają się więcej niż 10% 
     wszystkich danych. Każda taka wartość jest zastępowana poprzednią "dobrą" 
     wartością, która nie powtarza się ponad próg. Na końcu funkcja zwraca 
-    zmodyfikowaną kolumnę oraz wypisuje statystyki.
+    zmodyfikowaną kolumnę wraz ze statystykami oraz wypisuje statystyki.
 
     Args:
         column (pd.Series): Kolumna danych wejściowych (np. df['µ']).
         percent (float): procent powtarzania, default 0.1, od 0 do 1.
 
     Returns:
-        pd.Series: Zmodyfikowana kolumna z zastąpionymi wartościami.
+        tuple: (pd.Series, dict) - zmodyfikowana kolumna z zastąpionymi wartościami
+        oraz statystyki {'threshold', 'repeated' {wartość: liczba wystąpień}, 'replaced'}.
     """
     # Oblicz liczbę wystąpień każdej wartości
     value_counts = column.value_counts()
@@ -257,34 +330,31 @@ def replace_repeated_values(column, percent=0.1):
     threshold = len(column) * percent
     # Znajdź wartości, które powtarzają się więcej niż 10%
     repeated_values = value_counts[value_counts > threshold].index
+    stats = {'threshold': threshold,
+             'repeated': {value: int(value_counts[value]) for value in repeated_values},
+             'replaced': 0}
    # Jeśli nie ma wartości powtarzających się, zwróć kolumnę bez zmian
     if len(repeated_values) == 0:
-        return column
-    # Tworzenie kopii kolumny dla przechowania zmodyfikowanych danych
-    updated_column = column.copy()
+        return column, stats
+    # Maska wartości powtarzających się (NaN nie jest liczony w value_counts - to "dobra" wartość)
+    values = column.to_numpy()
+    repeated_mask = column.isin(repeated_values).to_numpy()
+    # Pozycja poprzedniej dobrej wartości dla każdego wiersza (forward-fill pozycji, -1 = brak)
+    positions = np.arange(len(values))
+    last_good = np.maximum.accumulate(np.where(repeated_mask, -1, positions))
+    # Zastąp tylko te, dla których znaleziono dobrą wartość (początkowy ciąg bez zmian)
+    replace_mask = repeated_mask & (last_good >= 0)
+    updated_column = pd.Series(np.where(replace_mask, values[np.maximum(last_good, 0)], values),
+                               index=column.index, name=column.name)
     # Zmienna do przechowywania liczby zamian
-    replacement_count = 0
-    # Iteracja po wartościach powtarzających się
-    for value in repeated_values:
-        # Znajdź indeksy wystąpień tej wartości
-        indices = column.index[column == value]
-        for idx in indices:
-            # Znajdź poprzednią dobrą wartość w kolumnie (nie należącą do repeated_values)
-            previous_value = None
-            for prev_idx in range(idx - 1, -1, -1):  # Iteracja wstecz
-                if column.iloc[prev_idx] not in repeated_values:
-                    previous_value = column.iloc[prev_idx]
-                    break
-            # Jeśli znaleziono dobrą wartość, zastąp powtarzającą się
-            if previous_value is not None:
-                updated_column.at[idx] = previous_value
-                replacement_count += 1
+    replacement_count = int(replace_mask.sum())
+    stats['replaced'] = replacement_count
 
     for value in repeated_values:
         print(f"Wartość: {value}, Liczba wystąpień: {value_counts[value]}")
     print(f"UWAGA! Liczba zastąpionych, powtarzających się wartości: {replacement_count}")
 
-    return updated_column
+    return updated_column, stats
 
 # Srednia ucinana, usuwa wstępnie peaki
 def replace_outliers(column, max_mean_range):
@@ -306,12 +376,13 @@ def replace_outliers(column, max_mean_range):
         max_cut_out = mean + max_mean_range
     else:
         max_cut_out = abs(mean) + max_mean_range
-    # Zlicz pikowe wartości
-    peak_cnt = column[(column > max_cut_out) | (column < -max_cut_out)].shape[0]
+    # Maska pikowych wartości i ich liczba
+    peak_mask = (column > max_cut_out) | (column < -max_cut_out)
+    peak_cnt = int(peak_mask.sum())
     # Oblicz średnią bez pików
     mean_value = column[(column <= max_cut_out) & (column >= -max_cut_out)].mean()
     # Zastąpienie pików średnią
-    updated_column = column.apply(lambda x: mean_value if x > max_cut_out or x < -max_cut_out else x)
+    updated_column = column.mask(peak_mask, mean_value)
     # Wyświetlenie liczby pików, jeśli są
     if peak_cnt > 0:
         print(f"Liczba przekroczeń średniej wartości w kolumnie '{column.name}' ({mean} + {max_mean_range}): {peak_cnt}")
@@ -328,26 +399,25 @@ def remove_peaks_auto_limit(column, std_multiplier):
     :param std_multiplier: Mnożnik odchylenia standardowego do ustalenia limitu.
     :return: Przetworzona kolumna z usuniętymi peakami.
     """
-    count = [0]  # Licznik wykrytych peaków
     # Obliczanie limitów na podstawie średniej i odchylenia standardowego
     mean = column.mean()
     std = column.std()
     lower_limit = mean - std_multiplier * std
     upper_limit = mean + std_multiplier * std
-    # Zastępowanie peaków
-    def replace_peak(value, prev=[None]):
-        if prev[-1] is None:  # Inicjalizacja pierwszej wartości
-            prev[-1] = value
-        if value < lower_limit or value > upper_limit:  # Jeśli wartość jest poza limitem
-            count[0] += 1  # Zwiększ licznik
-            return prev[-1]  # Zwróć ostatnią dobrą wartość
-        prev[-1] = value  # Zaktualizuj ostatnią dobrą wartość
-        return value
-    # Przetwarzanie kolumny
-    processed_column = column.apply(replace_peak)
+    # Maska peaków (NaN nie jest peakiem) i ich liczba
+    values = column.to_numpy()
+    peak_mask = (values < lower_limit) | (values > upper_limit)
+    count = int(peak_mask.sum())  # Licznik wykrytych peaków
+    # Pozycja ostatniej dobrej wartości - pierwsza wartość kolumny zawsze jest punktem startowym
+    positions = np.arange(len(values))
+    good = ~peak_mask
+    good[:1] = True
+    last_good = np.maximum.accumulate(np.where(good, positions, 0))
+    # Zastępowanie peaków ostatnią dobrą wartością (bez stanu między wywołaniami)
+    processed_column = pd.Series(values[last_good], index=column.index, name=column.name)
     # Wyświetlenie informacji o liczbie wykrytych peaków
-    if count[0] > 0:
-        print(f"Wykryte i zastąpione peaki w kolumnie '{column.name}': {count[0]} (limit min-max: [{lower_limit:.2f}, {upper_limit:.2f}])")
+    if count > 0:
+        print(f"Wykryte i zastąpione peaki w kolumnie '{column.name}': {count} (limit min-max: [{lower_limit:.2f}, {upper_limit:.2f}])")
     
     return processed_column
 
@@ -364,7 +434,7 @@ def sort_dataframe_by_column(df, column_name):
     return sorted_df
 
 # Usuwanie danych poza zakresem
-def remove_out_of_range_and_file_limit(df, distance_column, file_name, limit_in):
+def remove_out_of_range_and_file_limit(df, distance_column, distance_limit, limit_in):
     """
     Usuwa linie, w których:
     - Wartość w kolumnie distance przekracza limit podany w nazwie pliku.
@@ -372,16 +442,13 @@ def remove_out_of_range_and_file_limit(df, distance_column, file_name, limit_in)
     
     :param df: DataFrame do przetworzenia.
     :param distance_column: Nazwa kolumny z wartościami odległości.
-    :param file_name: Nazwa pliku, z której sprawdzamy limity.
+    :param distance_limit: Limit drogi odczytany z nazwy pliku (parse_file_parameters) lub None.
+    :param limit_in: Domyślny limit, gdy w nazwie pliku nie ma limitu.
     :return: Przetworzony DataFrame z usuniętymi błędnymi liniami.
     """
-    # Etap 1: Poszukiwanie liczby w nazwie pliku w formacie '1000m' lub '1000M' z opcjonalnymi spacjami
-    limit_pattern = r'(\d+)\s*[mM]\b'  # Zmienione wyrażenie regularne
-    cleaned_file_name = file_name.strip()  # Usuwanie spacji wokół nazwy pliku
-    match = re.search(limit_pattern, cleaned_file_name)
-    # Ustalenie limitu - jeśli nie znaleziono liczby, ustawiamy domyślny limit 1000
-    if match:
-        limit = int(match.group(1))
+    # Etap 1: Ustalenie limitu - jeśli w nazwie pliku nie było liczby, ustawiamy domyślny limit
+    if distance_limit is not None:
+        limit = distance_limit
     else:
         limit = limit_in + 1
     # Etap 2: Sprawdzenie, czy wartość w kolumnie distance przekracza limit
@@ -392,7 +459,7 @@ def remove_out_of_range_and_file_limit(df, distance_column, file_name, limit_in)
     cleaned_df = df[valid_distance_mask].reset_index(drop=True)
     # Informacja o liczbie usuniętych wierszy
     if removed_count > 0:
-        if match:
+        if distance_limit is not None:
             print(f"Usunięto {removed_count} wierszy, które przekroczyły zakres odczytany z pliku {limit}m.")
         else:
             print(f"Usunięto {removed_count} wierszy, które przekroczyły DOMYŚLNY zkres z kodu: {limit_in}m.")
@@ -430,24 +497,49 @@ def adjust_negative_offset(df, column):
     
     return df
 
-# Wczytanie dla tribometru T11 prędkości liniowej i obciążenia z nazwy pliku z danymi, obliczenie µ i Distance [m]
-def T11_calculations(df, file_name):
-    s = 0.1 # Default
-    F = 10 # Default
-    # Dodanie kolumn µ i Distance [m]
-    df["µ"] = 0.0  # Placeholder na współczynnik tarcia, do obliczenia poniżej
-    df["Distance [m]"] = 0.0  # Placeholder na drogę, do obliczenia poniżej
+# Parametry testu z nazwy pliku, odczytywane raz: prędkość liniowa [m/s], obciążenie [N], limit drogi [m]
+FILE_PARAMETER_PATTERNS = {
+    "speed": r'(?<!\d)(\d+(?:[.,]\d+)?)(?=\s?(?:m-s|ms|m\s?-\s?s))', # Obsługa liczb z kropką i przecinkiem
+    "load": r'(?<!\d)(\d+(?:[.,]\d+)?)(?=\s?[Nn])', # Obsługa liczb z kropką i przecinkiem
+    "distance_limit": r'(\d+)\s*[mM]\b', # Format '1000m' lub '1000M' z opcjonalnymi spacjami
+}
+
+def parse_file_parameters(file_name):
+    """
+    Odczytuje parametry testu z nazwy pliku (bez ścieżki).
+
+    Args:
+        file_name (str): Nazwa pliku z danymi.
 
+    Returns:
+        dict: {'file_name': str, 'speed': float | None, 'load': float | None,
+        'distance_limit': int | None} - None, gdy wartości nie ma w nazwie pliku.
+    """
+    params = {"file_name": file_name, "speed": None, "load": None, "distance_limit": None}
+    for key in ("speed", "load"):
+        match = re.search(FILE_PARAMETER_PATTERNS[key], file_name)
+        if match:
+            params[key] = float(match.group(1).replace(',', '.'))
+    match = re.search(FILE_PARAMETER_PATTERNS["distance_limit"], file_name.strip())
+    if match:
+        params["distance_limit"] = int(match.group(1))
+    return params
+
+# Prędkość liniowa z parametrów pliku lub domyślna 0.1 m/s, z informacją dla użytkownika
+def linear_speed(file_params, tribometer_name):
+    s = file_params["speed"]
+    if s is not None:
+        print(f"[{tribometer_name}] Odczytana prędkość liniowa: {s} m/s")
+        return s
+    # TODO Podanie ręcznie jak nie odczyta z nazwy pliku
+    print("\033[31mBrak odpowiedniej wartości m/s w nazwie pliku, np. 0.1m-s [zastosowano domyślnie 0.1m/s]\033[0m")
+    return 0.1 # Default
+
+# Dla tribometru T11 prędkość liniowa i obciążenie z parametrów pliku, obliczenie µ i Distance [m]
+def T11_calculations(df, file_params):
     # Obliczenie prędkości liniowej i drogi (Distance [m])
     try:
-        # Szukanie wartości s z nazwy pliku
-        match = re.search(r'(?<!\d)(\d+(?:[.,]\d+)?)(?=\s?(?:m-s|ms|m\s?-\s?s))', file_name) # Obsługa liczb z kropką i przecinkiem
-        if match:
-            s = float(match.group(1).replace(',', '.'))
-            print(f"[T11] Odczytana prędkość liniowa: {s} m/s")
-        else:
-            # TODO Podanie ręcznie jak nie odczyta z nazwy pliku
-            print("\033[31mBrak odpowiedniej wartości m/s w nazwie pliku, np. 0.1m-s [zastosowano domyślnie 0.1m/s]\033[0m")
+        s = linear_speed(file_params, "T11")
         # Obliczanie całkowitej przebytej drogi (m) przy stałej prędkości z każdej chwili czasowej
         df['Distance [m]'] = s * df['Time [s]']
     except Exception as e:
@@ -455,37 +547,29 @@ def T11_calculations(df, file_name):
 
     # Obliczenie współczynnika tarcia µ
     try:
-        # Szukanie wartości F z nazwy pliku
-        match = re.search(r'(?<!\d)(\d+(?:[.,]\d+)?)(?=\s?[Nn])', file_name) # Obsługa liczb z kropką i przecinkiem
-        if match:
-            F = float(match.group(1).replace(',', '.'))
+        F = file_params["load"]
+        if F is not None:
             print(f"[T11] Odczytana wartość obciążenia: {F} N")
         else:
             # TODO Podanie ręcznie jak nie odczyta z nazwy pliku
             print("\033[31mBrak odpowiedniej wartości F w nazwie pliku, np. 10N [zastosowano domyślnie 10N]\033[0m")
-        # Obliczanie µ = N/F, gdzie N to "Friction force [N]", F odczytane z pliku
-        df["µ"] = df["Friction force [N]"].apply(lambda N: N / F if N != 0 else 0)
+            F = 10 # Default
+        # Obliczanie µ = N/F, gdzie N to "Friction force [N]", F odczytane z pliku (0 dla N = 0)
+        friction_force = df["Friction force [N]"].to_numpy()
+        nonzero = friction_force != 0
+        if F == 0 and nonzero.any(): # Dzielenie tylko dla N różnego od 0 (F = 0 dopuszczalne, gdy wszystkie N = 0)
+            raise ZeroDivisionError("float division by zero")
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df["µ"] = np.where(nonzero, friction_force / F, 0.0)
     except Exception as e:
         raise ValueError(f"Problem z obliczeniem współczynnika tarcia µ: {e}")
     return df
 
-# Wczytanie dla tribometru Rtec prędkości liniowej z nazwy pliku z danymi, konwersja Penetration Depth [µm] i Distance [m]
-def Rtec_calculations(df, file_name):
-    s = 0.1 # Default
-    # Dodanie kolumn Penetration Depth [µm] i Distance [m]
-    df["Penetration Depth [µm]"] = 0.0  # Placeholder na zużycie liniowe, do obliczenia poniżej
-    df["Distance [m]"] = 0.0  # Placeholder na drogę, do obliczenia poniżej
-
+# Dla tribometru Rtec prędkość liniowa z parametrów pliku, konwersja Penetration Depth [µm] i Distance [m]
+def Rtec_calculations(df, file_params):
     # Obliczenie zuźycia liniowego i drogi (Distance [m])
     try:
-        # Szukanie wartości s z nazwy pliku
-        match = re.search(r'(?<!\d)(\d+(?:[.,]\d+)?)(?=\s?(?:m-s|ms|m\s?-\s?s))', file_name)# Obsługa liczb z kropką i przecinkiem
-        if match:
-            s = float(match.group(1).replace(',', '.'))
-            print(f"[Rtec] Odczytana prędkość liniowa: {s} m/s")
-        else:
-            # TODO Podanie ręcznie jak nie odczyta z nazwy pliku
-            print("\033[31mBrak odpowiedniej wartości m/s w nazwie pliku, np. 0.1m-s [zastosowano domyślnie 0.1m/s]\033[0m")
+        s = linear_speed(file_params, "Rtec")
         # Obliczanie całkowitej przebytej drogi (m) przy stałej prędkości z każdej chwili czasowej
         df['Distance [m]'] = s * df[' Timestamp']
     except Exception as e:
@@ -499,247 +583,352 @@ def Rtec_calculations(df, file_name):
         raise ValueError(f"Problem z obliczeniem zużycia liniowego: {e}")
     return df
 
-# Główna funkcja wczytująca pliki i dane do DataFrame (df)
-# 1. Otwiera plik w trybie odczytu, z kodowaniem UTF-8 i możliwością zastępowania błędów, 
-# 2. Wczytuje wszystkie linie z pliku do listy, usuwa znak BOM, 
-# 3. Definiowanie typów tribometrów i rodzajów trybu pracy, 
-# 4. Wyszukiwanie nagłówka i przypisanie tribometru i rodzaju po nagłówku, 
-# 5. Walidacja danych, usunięcie nieprawidłowych, utworzenie DataFrame,
-# 6. Podział danych na tribometry i obróbka według każdego rodzaju tribometru i typu
-def read_and_process_file(file_path):
+# Liczba linii danych w buforze (mmap / bytes) od podanego bajtu i liczba pól w najdłuższej linii
+# (separatory + 1), bez tworzenia obiektów str
+def count_data_rows(buffer, offset, sep, block_size=64 * 1024 * 1024):
+    data = np.frombuffer(buffer, dtype=np.uint8)[offset:]
+    sep_byte = ord(sep)
+    block = None
     try:
-        # Otwórz pliki
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-            lines = file.readlines()
-
-        # Usuń BOM z pierwszej linii, jeśli jest obecny (tylko w UTF-8)
-        if lines[0].startswith('\ufeff'):
-            lines[0] = lines[0][1:]
-        
-        # Zdefiniuj możliwe typy tribometrów i trybów
-        # tribometer_types = ["Nano", "T11", "TRB3", "Rtec"]
-        tribometer_types = ["\033[38;5;214mNano\033[0m", "\033[38;5;214mT11\033[0m", "\033[38;5;214mTRB3\033[0m", "\033[38;5;214mRtec\033[0m"] # Nano NTR, T11, TRB3, Rtec
-        modes = ["\033[38;5;208mLinear\033[0m", "\033[38;5;208mRotary\033[0m"] # Linear, Rotary
-
-        # Znajdź linię z nagłówkiem i ustal początek danych (ich indeks)
-        start_index = None
-        tribometer_type = ""
-        mode = ""
-        
-        # Początek danych, typ tribometru i tryb
-        for i, line in enumerate(lines):
-            # Tryb
-            if "Linear mode" in line:
-                mode = modes[0]  # "Linear"
-            elif "Single-way mode" in line:
-                mode = modes[1]  # "Rotary"
-            # Typ
-            if "Nano Tribometer" in line:
-                tribometer_type = tribometer_types[0]  # "Nano" (NTR)
-            elif "TRB3" in line:
-                tribometer_type = tribometer_types[2]  # "TRB3"
-            # Tryb i typ i index
-            # Nano Tribometer (NTR)
-            if "Time [s]\tDistance [m]\tlaps\tSequence ID\tCycle ID\tMax linear speed [m/s]\tNominal Load [mN]\tµ\tAngle [°]\tNormal force [mN]\tFriction force [mN]\tPenetration depth [µm]" in line:
-                mode = modes[1]  # "Rotary" - bo jest Angle [°] w headerze
-                tribometer_type = tribometer_types[0]  # "Nano" - bo jest jednostka "mN" w headerze
-                start_index = i # i czyli zaczyna od headera
-            elif "Time [s]\tDistance [m]\tlaps\tSequence ID\tCycle ID\tMax linear speed [m/s]\tNominal Load [mN]\tµ\tLinear Position [mm]\tNormal force [mN]\tFriction force [mN]\tPenetration depth [µm]" in line:
-                mode = modes[0]  # "Linear" - bo jest Linear Position [mm] w headerze
-                tribometer_type = tribometer_types[0]  # "Nano" - bo jest jednostka "mN" w headerze
-                start_index = i # i czyli zaczyna od headera
-            # TRB3
-            elif "Time [s]\tDistance [m]\tLaps\tSequence ID\tCycle ID\tMax Linear Speed [m/s]\tNominal Load [N]\tµ\tAngle [°]\tFriction Force [N]\tTemperature [°C]\tHumidity [%]\tPenetration Depth [µm]" in line:
-                mode = modes[1]  # "Rotary" - bo jest Angle [°] w headerze
-                tribometer_type = tribometer_types[2]  # "TRB3" - bo jest jednostka "N" oraz Temperature [°C] i Humidity [%] w headerze
-                start_index = i # i czyli zaczyna od headera
-            elif "Time [s]\tDistance [m]\tLaps\tSequence ID\tCycle ID\tMax Linear Speed [m/s]\tNominal Load [N]\tµ\tLinear Position [mm]\tFriction Force [N]\tTemperature [°C]\tHumidity [%]\tPenetration Depth [µm]" in line:
-                mode = modes[0]  # "Linear" - bo jest Linear Position [mm] w headerze
-                tribometer_type = tribometer_types[2]  # "TRB3" - bo jest jednostka "N" oraz Temperature [°C] i Humidity [%] w headerze
-                start_index = i # i czyli zaczyna od headera
-            # T11
-            elif "Time [s];Friction force [N];Displacement [um];Temperature2 [C];Temperature1 [C];Rotational speed [rpm];Number of revolutions" in line:
-                mode = modes[1]  # "Rotary" - bo jest Number of revolutions w headerze
-                tribometer_type = tribometer_types[1]  # "T11" - bo separator ";" oraz Temperature1 [C] i Temperature2 [C]
-                start_index = i # i czyli zaczyna od headera
-            # Rtec
-            elif "Step, Timestamp, RecipeStep, DAQ.Fz (N),DAQ.Fx (N),DAQ.COF (),Rotary.Velocity (rpm),XYZ.Z Depth (mm),XYZ.Z Position (mm),Rotary.Angle (deg)," in line:
-                mode = modes[1]  # "Rotary" - bo jest Rotary.Angle (deg) w headerze
-                tribometer_type = tribometer_types[3]  # "Rtec" - bo jest separator "," oraz inne nagłówki i jednostki w "()"
-                start_index = i # i czyli zaczyna od headera
-        
-        if start_index is None:
-            raise ValueError(f"\033[91m Nie znaleziono odpowiedniej linii rozpoczynającej dane w pliku: {file_path} \033[0m")
-        
-        # Wczytaj nagłówek i dane
-        # HEADER
-        # .rstrip() - Usuń znaki końca linii i separator na końcu jak są
-        # Dla T11 ";" jako separator
-        if tribometer_type == tribometer_types[1]:  # "T11"
-            header = lines[start_index].strip().rstrip(';\r\n').split(';')
-        # Dla TRB3 i Nano TRB to TAB (\t) jako separator
-        elif tribometer_type == tribometer_types[2] or tribometer_type == tribometer_types[0]:  # "TRB3 i Nano"
-            header = lines[start_index].strip().rstrip('\t\r\n').split('\t')
-        # Dla Rtec "," jako separator
-        elif tribometer_type == tribometer_types[3]:  # "Rtec"
-            header = lines[start_index].strip().rstrip(',\r\n').split(',')
-        # W innym przypadku lub błędu
-        else:
-            raise ValueError(f"\033[91m Nie znaleziono separatora nagłówków \033[0m")
-
-        # DANE
-        # Dla T11 i Rtec dodatkowy poniżej fix na usunięcie znaku separatora na końcu linii i usunięcie linii z wartościami zerowymi w kolumnie "Friction force [N]"
-        data = []
-        valid_rows = 0
-        invalid_rows = 0
-        for line in lines[start_index + 1:]:
-            # Dla T11 ";" jako separator
-            if tribometer_type == tribometer_types[1]:  # "T11"
-                line = line.strip().rstrip('\r\n;') # Usuń znaki końca linii i separator na końcu jak są
-                row = line.strip().split(';')
-            # Dla Rtec "," jako separator
-            elif tribometer_type == tribometer_types[3]:  # "Rtec"
-                line = line.strip().rstrip('\r\n,') # Usuń znaki końca linii i separator na końcu jak są
-                row = line.strip().split(',')
-            # Dla TRB3 i Nano TRB to TAB (\t) jako separator
-            elif tribometer_type == tribometer_types[2] or tribometer_type == tribometer_types[0]:  # "TRB3 i Nano"
-                line = line.strip().rstrip('\r\n\t') # Usuń znaki końca linii i separator na końcu jak są
-                row = line.strip().split('\t')
-            # W innym przypadku lub błędu
-            else:
-                raise ValueError(f"\033[91m Nie znaleziono separatora danych \033[0m")
-            
-            # Walidacja, czy wiersz zawiera odpowiednią liczbę kolumn, jak nie to pomiń
-            if len(row) != len(header):
-                invalid_rows += 1
+        rows = 0
+        max_separators = 0
+        line_separators = 0 # Separatory linii zaczętej w poprzednim bloku
+        for start in range(0, len(data), block_size):
+            block = data[start:start + block_size]
+            newlines = np.flatnonzero(block == ord('\n'))
+            separators = np.flatnonzero(block == sep_byte)
+            rows += len(newlines)
+            if len(newlines) == 0:
+                line_separators += len(separators)
                 continue
+            # Liczba separatorów przed każdym końcem linii, różnice = separatory w kolejnych liniach
+            before = np.searchsorted(separators, newlines)
+            max_separators = max(max_separators, line_separators + int(before[0]))
+            if len(newlines) > 1:
+                max_separators = max(max_separators, int(np.diff(before).max()))
+            line_separators = len(separators) - int(before[-1])
+        # Ostatnia linia bez znaku końca linii
+        if len(data) > 0 and data[-1] != ord('\n'):
+            rows += 1
+            max_separators = max(max_separators, line_separators)
+    finally:
+        del data, block # Zwolnij widoki na bufor (mmap można zamknąć dopiero bez widoków)
+    return rows, max_separators + 1
+
+# Maksymalna liczba pól za ostatnią kolumną nagłówka czytanych przez parser (separatory na końcu linii),
+# ogranicza liczbę kolumn parsera przy pojedynczej uszkodzonej linii z tysiącami separatorów
+MAX_TRAILING_FIELDS = 16
+
+# Wczytanie części numerycznej pliku (wiersze pod nagłówkiem) parserem C z pandas, porcjami
+def parse_numeric_body(source, column_count, sep, decimal='.', total_rows=None, field_count=None, usecols=None, chunk_rows=262144, progress=None):
+    """
+    Parsuje dane numeryczne spod nagłówka bez pętli po wierszach i komórkach w Pythonie.
+    Zasady jak dotychczas: wiersz z inną liczbą kolumn niż nagłówek albo z komórką,
+    która nie jest liczbą, jest pomijany i liczony jako niepoprawny. Puste pola na końcu
+    linii (separatory jak przy rstrip(sep), do MAX_TRAILING_FIELDS) są dozwolone, przecinek
+    dziesiętny jest zamieniany na kropkę, a zapis naukowy (np. 1.5e-3) jest akceptowany.
+    Dane są czytane porcjami po chunk_rows wierszy wprost do jednej tablicy wyjściowej,
+    więc w pamięci jest tylko wynik i jedna porcja (również dla plików wielogigabajtowych).
 
-            # Walidacja, czy wszystkie elementy można skonwertować na float (zamiana ewentualnie , na .)
-            try:
-                #row = [float(value.replace(',', '.')) for value in row]
-                #data.append(row)
-                #liczba_poprawnych_wierszy += 1
-                for i in range(len(row)):
-                    if ',' in row[i]: # jeśli przecinek
-                        row[i] = row[i].replace(',', '.') # konwertuj na kropkę
-                    if not re.match(r'^-?\d+(?:\.\d+)?$', row[i]): # jeśli jest tekst to pomijaj linię
-                        invalid_rows += 1
-                        break
-                    else:
-                        row[i] = float(row[i]) # jeśli wszystko w porządku, konwertuj na float
+    Args:
+        source: Obiekt plikowy (np. mmap) ustawiony na początek danych, bez linii nagłówka.
+        column_count (int): Liczba kolumn z nagłówka.
+        sep (str): Separator kolumn.
+        decimal (str): Znak dziesiętny przyjęty dla szybkiej ścieżki parsera ('.' lub ',').
+        total_rows (int): Liczba wszystkich linii danych (count_data_rows), potrzebna do
+            zliczenia niepoprawnych wierszy i rozmiaru wyniku.
+        field_count (int): Liczba pól w najdłuższej linii (count_data_rows). Parser czyta tyle
+            kolumn (najwyżej column_count + MAX_TRAILING_FIELDS), więc żaden wiersz nie jest
+            skracany ani przesuwany, a wiersz z niepustymi polami za ostatnią kolumną nagłówka
+            jest niepoprawny. None - column_count + 2.
+        usecols (list): Indeksy kolumn zwracanych w wyniku, gdy None - wszystkie.
+            Walidowane są zawsze wszystkie kolumny.
+        chunk_rows (int): Liczba wierszy w jednej porcji parsera.
+        progress (callable): Funkcja wywoływana po każdej porcji ze zdarzeniem {'event': 'read',
+            'bytes_done' - pozycja w source, 'rows' - wiersze przeczytane}, None - bez zdarzeń.
+
+    Returns:
+        tuple: (np.ndarray float64 [wiersze x kolumny z usecols], liczba poprawnych, liczba niepoprawnych)
+    """
+    if usecols is None:
+        usecols = list(range(column_count))
+    # Kolumny za ostatnią kolumną nagłówka (separatory na końcu linii albo nadmiarowe pola)
+    if field_count is None:
+        field_count = column_count + 2
+    # Linie z więcej niż MAX_TRAILING_FIELDS polami za ostatnią kolumną parser odrzuca (on_bad_lines)
+    field_count = min(max(field_count, column_count), column_count + MAX_TRAILING_FIELDS)
+    # Porcja o rozmiarze w pamięci jak dla column_count + 2 kolumn, także gdy szersza linia zwiększa liczbę kolumn
+    chunk_rows = max(1024, chunk_rows * (column_count + 2) // max(field_count, column_count + 2))
+    # Tablica wyniku kolumnami (każda kolumna ciągła w pamięci), docinana na końcu
+    capacity = total_rows if total_rows is not None else 0
+    values = np.empty((len(usecols), capacity), dtype=np.float64)
+    valid_rows = 0
+    parsed_rows = 0
+    # Za szerokie linie na początku danych pominięte (niepoprawne) - z pierwszej linii parser ustala liczbę
+    # kolumn, za szeroką skraca zamiast ją odrzucić (a bardzo szeroką czyta bardzo wolno)
+    sep_bytes = sep.encode('utf-8')
+    skipped_rows = 0
+    start = source.tell()
+    line = source.readline()
+    while line and line.count(sep_bytes) >= field_count:
+        skipped_rows += 1
+        start = source.tell()
+        line = source.readline()
+    source.seek(start)
+    if not line:
+        return values[:, :0].T, 0, skipped_rows
+    # index_col=False - pola nadmiarowe nie stają się indeksem (przesunięcie wszystkich wierszy)
+    with pd.read_csv(source, sep=sep, header=None, names=range(field_count), index_col=False,
+                     decimal=decimal, engine='c', float_precision='round_trip', quoting=csv.QUOTE_NONE,
+                     skip_blank_lines=False, on_bad_lines='skip', encoding='utf-8', encoding_errors='replace',
+                     chunksize=chunk_rows) as reader:
+        for raw in reader:
+            parsed_rows += len(raw)
+            chunk = np.empty((column_count, len(raw)), dtype=np.float64)
+            for i in range(column_count):
+                column = raw[i]
+                if pd.api.types.is_float_dtype(column) or pd.api.types.is_integer_dtype(column):
+                    chunk[i] = column.to_numpy(dtype=np.float64)
                 else:
-                    data.append(row) # przypisz do nowej macierzy dane wyselekcjonowane / poprawne
-                    valid_rows += 1
+                    # Kolumny, których parser nie rozpoznał w całości jako liczby (tekst, inny znak dziesiętny)
+                    column = column.astype(str).str.replace(',', '.', regex=False)
+                    numeric = pd.to_numeric(column, errors='coerce')
+                    numeric_mask = numeric.notna()
+                    try:
+                        # Konwersja tekstu jak float() w Pythonie (dokładnie ta sama wartość co parser C)
+                        numeric[numeric_mask] = column[numeric_mask].astype(np.float64)
+                    except ValueError:
+                        pass
+                    chunk[i] = numeric.to_numpy(dtype=np.float64)
+            # Wiersz poprawny: wszystkie liczby skończone i puste pola za ostatnią kolumną
+            valid_mask = np.isfinite(chunk).all(axis=0)
+            for i in range(column_count, field_count):
+                empty = raw[i].isna().to_numpy()
+                if sep.isspace() and raw[i].dtype == object:
+                    # Separator TAB: pola z samych spacji na końcu linii usuwało strip() jak dotychczas
+                    empty |= raw[i].str.strip().eq('').to_numpy()
+                valid_mask &= empty
+            chunk = chunk[usecols][:, valid_mask]
+            if valid_rows + chunk.shape[1] > values.shape[1]:
+                # Bez total_rows (lub gdy liczba linii była zaniżona) powiększ tablicę wyniku
+                grown = np.empty((len(usecols), max(2 * values.shape[1], valid_rows + chunk.shape[1])), dtype=np.float64)
+                grown[:, :valid_rows] = values[:, :valid_rows]
+                values = grown
+            values[:, valid_rows:valid_rows + chunk.shape[1]] = chunk
+            valid_rows += chunk.shape[1]
+            if progress is not None:
+                progress({"event": "read", "bytes_done": source.tell(), "rows": parsed_rows})
+    if total_rows is None:
+        total_rows = skipped_rows + parsed_rows
+    invalid_rows = total_rows - valid_rows
+
+    return values[:, :valid_rows].T, valid_rows, invalid_rows
+
+# Krok obróbki działający na jednej kolumnie, np. column_step(replace_outliers, 'µ', 1.0)
+def column_step(function, column, *args, **kwargs):
+    def step(df, file_params):
+        result = function(df[column], *args, **kwargs)
+        # Funkcje zwracające (kolumna, statystyki) - statystyki trafiają do df.attrs
+        if isinstance(result, tuple):
+            result, stats = result
+            df.attrs.setdefault(function.__name__, {})[column] = stats
+        df[column] = result
+        return df
+    return step
+
+# Set 0 to all rows in this column (just in case) - Nano TRB (NTR) nie mierzy zużycia liniowego
+def zero_penetration_depth(df, file_params):
+    df['Penetration Depth [µm]'] = 0
+    return df
+
+# Obróbka danych Rtec po przeliczeniu jednostek: sortowanie, limit drogi z nazwy pliku, usunięcie peaków
+def Rtec_cleanup(df, file_params):
+    # Sortowanie rosnąco według 'Distance [m]' (usuwa dziwne anomalie w danych)
+    df = sort_dataframe_by_column(df, 'Distance [m]')
+    # usuwanie danych poza zakresem - 1000 m maksymalny zakres jak nie będzie podany w nazwie pliku
+    df = remove_out_of_range_and_file_limit(df, 'Distance [m]', file_params["distance_limit"], 1000)
+    # Usunięcie peaków za pomocą odchylenia standardowego razy 3 --- µ ---
+    df['µ'] = remove_peaks_auto_limit(df['µ'], std_multiplier=3)
+    # Usunięcie peaków za pomocą odchylenia standardowego razy 2 --- Penetration Depth [µm] ---
+    df['Penetration Depth [µm]'] = remove_peaks_auto_limit(df['Penetration Depth [µm]'], std_multiplier=2)
+    return df
+
+# Nagłówki danych tribometrów
+NANO_HEADER = "Time [s]\tDistance [m]\tlaps\tSequence ID\tCycle ID\tMax linear speed [m/s]\tNominal Load [mN]\tµ\t{}\tNormal force [mN]\tFriction force [mN]\tPenetration depth [µm]"
+TRB3_HEADER = "Time [s]\tDistance [m]\tLaps\tSequence ID\tCycle ID\tMax Linear Speed [m/s]\tNominal Load [N]\tµ\t{}\tFriction Force [N]\tTemperature [°C]\tHumidity [%]\tPenetration Depth [µm]"
+T11_HEADER = "Time [s];Friction force [N];Displacement [um];Temperature2 [C];Temperature1 [C];Rotational speed [rpm];Number of revolutions"
+RTEC_HEADER = "Step, Timestamp, RecipeStep, DAQ.Fz (N),DAQ.Fx (N),DAQ.COF (),Rotary.Velocity (rpm),XYZ.Z Depth (mm),XYZ.Z Position (mm),Rotary.Angle (deg),"
+
+# Rejestr formatów plików z tribometrów, nowy tribometr = nowy wpis w rejestrze
+# name - typ tribometru, mode - rodzaj ruchu (Linear - posuwisto-zwrotny, Rotary - obrotowy),
+# signature - nagłówek danych (bajty UTF-8), sep - separator, decimal - znak dziesiętny,
+# keep - kolumny wczytywane do obróbki, columns - zmiana nazw kolumn, steps - kolejne kroki obróbki step(df, file_params) -> df
+# (file_params - parametry testu z nazwy pliku, patrz parse_file_parameters)
+TRIBOMETER_FORMATS = [
+    # Nano Tribometer (NTR) - jednostka "mN" w headerze, Linear Position [mm] to ruch posuwisto-zwrotny
+    {"name": "Nano", "mode": "Linear", "signature": NANO_HEADER.format("Linear Position [mm]"), "sep": "\t", "decimal": ".",
+     "keep": ['Distance [m]', 'µ', 'Linear Position [mm]'],
+     "columns": {},
+     "steps": [zero_penetration_depth,
+               column_step(replace_outliers, 'µ', 1.0), # Obliczenie średniej ucinanej dla wartości bez pików
+               column_step(replace_repeated_values, 'µ'), # Usuń powtarzające się te same liczby, więcej niż 10% zbioru danych (FIX)
+               lambda df, file_params: linear_mode_u_preprocessing(df), # Konwersja przebiegu 'µ' z pseudo-sinusoidalnego / prostokątnego na liniowy
+               column_step(remove_peaks_auto_limit, 'µ', std_multiplier=2)]}, # Usunięcie peaków za pomocą odchylenia standardowego razy 2
+    # Nano Tribometer (NTR) - Angle [°] w headerze to ruch obrotowy
+    {"name": "Nano", "mode": "Rotary", "signature": NANO_HEADER.format("Angle [°]"), "sep": "\t", "decimal": ".",
+     "keep": ['Distance [m]', 'µ'],
+     "columns": {},
+     "steps": [zero_penetration_depth,
+               column_step(replace_outliers, 'µ', 1.0),
+               column_step(replace_repeated_values, 'µ')]},
+    # TRB3 - jednostka "N" oraz Temperature [°C] i Humidity [%] w headerze
+    {"name": "TRB3", "mode": "Linear", "signature": TRB3_HEADER.format("Linear Position [mm]"), "sep": "\t", "decimal": ".",
+     "keep": ['Distance [m]', 'µ', 'Linear Position [mm]', 'Penetration Depth [µm]'],
+     "columns": {},
+     "steps": [column_step(replace_repeated_values, 'µ'),
+               lambda df, file_params: linear_mode_u_preprocessing(df),
+               column_step(remove_peaks_auto_limit, 'µ', std_multiplier=2)]},
+    {"name": "TRB3", "mode": "Rotary", "signature": TRB3_HEADER.format("Angle [°]"), "sep": "\t", "decimal": ".",
+     "keep": ['Distance [m]', 'µ', 'Penetration Depth [µm]'],
+     "columns": {},
+     "steps": []},
+    # T11 - separator ";" oraz Temperature1 [C] i Temperature2 [C], Number of revolutions to ruch obrotowy
+    {"name": "T11", "mode": "Rotary", "signature": T11_HEADER, "sep": ";", "decimal": ",",
+     "keep": ['Time [s]', 'Friction force [N]', 'Displacement [um]'],
+     "columns": {'Displacement [um]': 'Penetration Depth [µm]'},
+     "steps": [column_step(replace_repeated_values, 'Friction force [N]', 0.05), # Usuń powtarzające się te same liczby, więcej niż 5% zbioru danych (FIX)
+               T11_calculations]}, # Dodanie kolumn "Distance [m]" oraz "µ" i obliczenie tych danych dla Tribometru T11
+    # Rtec - separator "," oraz inne nagłówki i jednostki w "()", Rotary.Angle (deg) to ruch obrotowy
+    {"name": "Rtec", "mode": "Rotary", "signature": RTEC_HEADER, "sep": ",", "decimal": ".",
+     "keep": [' Timestamp', 'DAQ.COF ()', 'XYZ.Z Position (mm)'],
+     "columns": {'DAQ.COF ()': 'µ'},
+     "steps": [column_step(replace_repeated_values, 'µ', 0.05), # Usuń powtarzające się te same liczby, więcej niż 5% zbioru danych (FIX)
+               Rtec_calculations, # Konwersja XYZ.Z Position (mm) na um oraz obliczenie Distance [m] z Time [s]
+               Rtec_cleanup]},
+]
+for tribometer_format in TRIBOMETER_FORMATS:
+    tribometer_format["signature"] = re.compile(re.escape(tribometer_format["signature"].encode('utf-8')))
+
+# Kolumny danych wyjściowych, wspólne dla wszystkich tribometrów
+OUTPUT_COLUMNS = ['Distance [m]', 'µ', 'Penetration Depth [µm]']
+# Ile bajtów z początku pliku czytać naraz i maksymalnie przy szukaniu nagłówka
+HEADER_BLOCK_SIZE = 16 * 1024
+HEADER_SEARCH_LIMIT = 1024 * 1024
+
+# Wykrycie formatu pliku po nagłówku, czyta tylko początek pliku i kończy po znalezieniu nagłówka
+def detect_file_format(file):
+    """
+    Szuka sygnatury nagłówka z TRIBOMETER_FORMATS w początkowych blokach pliku.
+
+    Args:
+        file: Plik otwarty binarnie, ustawiony na początek.
+
+    Returns:
+        tuple: (wpis z TRIBOMETER_FORMATS, kolumny nagłówka, bajt początku danych)
+               albo (None, None, None) gdy nie znaleziono nagłówka.
+    """
+    prefix = b""
+    while len(prefix) < HEADER_SEARCH_LIMIT:
+        block = file.read(HEADER_BLOCK_SIZE)
+        if not block:
+            break
+        prefix += block
+        # Najwcześniejszy nagłówek w pliku, ale tylko z kompletną linią (jest koniec linii lub koniec pliku)
+        found = None
+        for tribometer_format in TRIBOMETER_FORMATS:
+            match = tribometer_format["signature"].search(prefix)
+            if match and (found is None or match.start() < found[0]):
+                found = (match.start(), tribometer_format)
+        if found is None:
+            continue
+        start, tribometer_format = found
+        line_start = prefix.rfind(b"\n", 0, start) + 1
+        line_end = prefix.find(b"\n", start)
+        if line_end == -1:
+            if len(block) == HEADER_BLOCK_SIZE:
+                continue  # Linia nagłówka niekompletna, doczytaj kolejny blok
+            line_end = len(prefix)
+        # Dekodowanie tylko linii nagłówka, usunięcie BOM (tylko w UTF-8)
+        header_line = prefix[line_start:line_end].decode('utf-8', errors='replace').lstrip('\ufeff')
+        # .rstrip() - Usuń znaki końca linii i separator na końcu jak są
+        sep = tribometer_format["sep"]
+        header = header_line.strip().rstrip(sep + '\r\n').split(sep)
+        return tribometer_format, header, line_end + 1
+    return None, None, None
+
+# Wczytanie części numerycznej danych z tribometru: wykrycie formatu po nagłówku i parsowanie danych spod nagłówka
+# z pliku otwartego binarnie (mapowany do pamięci) lub z io.BytesIO (dane w pamięci, parser czyta wprost z bufora)
+def read_tribometer_data(file, progress=None):
+    """
+    Args:
+        file: Plik otwarty binarnie lub io.BytesIO, ustawiony na początek.
+        progress (callable): Funkcja postępu parsera (parse_numeric_body) lub None.
+
+    Returns:
+        tuple: (wpis z TRIBOMETER_FORMATS, np.ndarray float64 [wiersze x kolumny 'keep'], liczba poprawnych,
+        liczba niepoprawnych) albo (None, None, 0, 0) gdy nie znaleziono nagłówka.
+    """
+    tribometer_format, header, data_offset = detect_file_format(file)
+    if tribometer_format is None:
+        return None, None, 0, 0
+    sep = tribometer_format["sep"]
+    # Wczytywane są tylko kolumny potrzebne do obróbki (walidowane są wszystkie)
+    usecols = [header.index(column) for column in tribometer_format["keep"]]
+    options = {"usecols": usecols, "progress": progress}
+    if isinstance(file, io.BytesIO):
+        with file.getbuffer() as view:
+            total_rows, field_count = count_data_rows(view, data_offset, sep)
+        file.seek(data_offset)
+        values, valid_rows, invalid_rows = parse_numeric_body(file, len(header), sep, tribometer_format["decimal"], total_rows=total_rows, field_count=field_count, **options)
+    else:
+        # Parser C z pandas czyta bajty wprost z mapowanego pliku, od początku danych
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            total_rows, field_count = count_data_rows(buffer, data_offset, sep)
+            buffer.seek(data_offset)
+            values, valid_rows, invalid_rows = parse_numeric_body(buffer, len(header), sep, tribometer_format["decimal"], total_rows=total_rows, field_count=field_count, **options)
+    return tribometer_format, values, valid_rows, invalid_rows
+
+# DataFrame z kolumn 'keep' i obróbka według kroków zapisanych w rejestrze dla danego tribometru i rodzaju ruchu,
+# parametry testu (file_params) i tribometr zapisane w df.attrs
+def prepare_tribometer_data(values, tribometer_format, file_params):
+    df = pd.DataFrame(values, columns=tribometer_format["keep"])
+    df = df.rename(columns=tribometer_format["columns"])
+    for step in tribometer_format["steps"]:
+        df = step(df, file_params)
+    # Wybierz interesujące kolumny, parametry pliku pozostają przy danych
+    df = df[OUTPUT_COLUMNS]
+    df.attrs["file_params"] = file_params
+    df.attrs["tribometer"] = {"name": tribometer_format["name"], "mode": tribometer_format["mode"]}
+    return df
+
+# Typ tribometru i tryb do wyświetlania
+def tribometer_labels(tribometer_format):
+    return f"\033[38;5;214m{tribometer_format['name']}\033[0m", f"\033[38;5;208m{tribometer_format['mode']}\033[0m"
+
+# Główna funkcja wczytująca pliki i dane do DataFrame (df)
+# 1. Otwiera plik binarnie i wykrywa format tribometru po nagłówku z początku pliku (TRIBOMETER_FORMATS),
+# 2. Wczytuje dane spod nagłówka (UTF-8 z zastępowaniem błędów), walidacja, usunięcie nieprawidłowych, utworzenie DataFrame,
+# 3. Obróbka według kroków zapisanych w rejestrze dla danego tribometru i rodzaju ruchu
+def read_and_process_file(file_path, progress=None):
+    try:
+        # Otwórz plik binarnie, znajdź nagłówek (dekodowany jest tylko nagłówek) i zmapuj plik do pamięci
+        with open(file_path, 'rb') as file:
+            tribometer_format, values, valid_rows, invalid_rows = read_tribometer_data(file, progress)
+        if tribometer_format is None:
+            raise ValueError(f"\033[91m Nie znaleziono odpowiedniej linii rozpoczynającej dane w pliku: {file_path} \033[0m")
+        tribometer_type, mode = tribometer_labels(tribometer_format)
 
-            except ValueError as e:
-                #print(f"\033[91m Błąd konwersji wartości na float w wierszu: {row} \033[0m")
-                invalid_rows += 1
-                continue
-        
         if invalid_rows > 0:
             print(f"[{tribometer_type}] \033[91mLiczba niepoprawnych wierszy: {invalid_rows} z {valid_rows + invalid_rows}\033[0m")
 
-        # Usuń wiersze z brakującymi lub nieprawidłowymi danymi
-        data = [row for row in data if all(value != '' and value is not None for value in row)]
-
         # Sprawdź, czy są jakieś poprawne dane do przetworzenia
-        if not data:
+        if valid_rows == 0:
             raise ValueError(f"\033[91m Brak poprawnych danych w pliku {file_path} \033[0m")
 
-        # Stwórz DataFrame
-        df = pd.DataFrame(data, columns=header)
+        # Obróbka według tribometru i rodzaju ruchu, parametry testu z nazwy pliku odczytane jeden raz
+        df = prepare_tribometer_data(values, tribometer_format, parse_file_parameters(os.path.basename(file_path)))
         # PRINT ILE LINII
         #print(f"[DEBUG] Wczytano: {len(df)} linii danych")
-
-        # Sprawdź, czy plik zawiera kolumnę "Linear Position [mm]" jak tak to ruch Posuwisto-Zwrotny
-        if mode == modes[0]:  # "Linear"
-            if tribometer_type == tribometer_types[2] or tribometer_type == tribometer_types[0]:  # "TRB3 i Nano"
-                if tribometer_type == tribometer_types[0]:  # "Nano" (NTR) - JUST IN CASE
-                    # Set 0 to all rows in this column (just in case)
-                    df['Penetration Depth [µm]'] = 0
-                    # Obliczenie średniej ucinanej dla wartości bez pików
-                    df['µ'] = replace_outliers(df['µ'], 1.0)
-
-                # Usuń powtarzające się te same liczby, więcej niż 10% zbioru danych (FIX)
-                df['µ'] = replace_repeated_values(df['µ'])
-                # Konwersja przebiegu 'µ' z pseudo-sinusoidalnego / prostokątnego na liniowy
-                #print(f"[DEBUG] print pierwszych 10 wierszy df: {df.head(10)}")
-                df = linear_mode_u_preprocessing(df)
-                # Usunięcie peaków za pomocą odchylenia standardowego razy 2
-                df['µ'] = remove_peaks_auto_limit(df['µ'], std_multiplier=2)
-                # Wybierz interesujące kolumny
-                df = df[['Distance [m]', 'µ', 'Penetration Depth [µm]']]
-            else:
-                raise ValueError(f"\033[91m Brak funkcji programu typu: {mode}, dla tego tribometru: {tribometer_type} \033[0m")
-        # Jak nie to ruch Obrotowy
-        elif mode == modes[1]:  # "Rotary"
-            # Jeśli jest to Nano TRB (NTR)
-            if tribometer_type == tribometer_types[0]:  # "Nano"
-                # Set 0 to all rows in this column (just in case)
-                df['Penetration Depth [µm]'] = 0
-                # Obliczenie średniej ucinanej dla wartości bez pików
-                df['µ'] = replace_outliers(df['µ'], 1.0)
-                # Usuń powtarzające się te same liczby, więcej niż 10% zbioru danych (FIX)
-                df['µ'] = replace_repeated_values(df['µ'])
-                # Wybierz interesujące kolumny
-                df = df[['Distance [m]', 'µ', 'Penetration Depth [µm]']]
-
-            # Jeśli to T11
-            elif tribometer_type == tribometer_types[1]:  # "T11"
-                # Usuń powtarzające się te same liczby, więcej niż 5% zbioru danych (FIX)
-                df['Friction force [N]'] = replace_repeated_values(df['Friction force [N]'], 0.05)
-
-                # # Znajdź najniższą wartość w kolumnie "Friction force [N]"
-                #df = adjust_negative_offset(df, 'Friction force [N]')
-
-                # Zmień nazwy kolumny
-                df = df.rename(columns={'Displacement [um]': 'Penetration Depth [µm]'})
-                # Dodanie kolumn "Distance [m]" oraz "µ" i obliczenie tych danych dla Tribometru T11
-                df = T11_calculations(df, os.path.basename(file_path))
-                
-                # Wybierz interesujące kolumny
-                df = df[['Distance [m]', 'µ', 'Penetration Depth [µm]']]
-            # Jeśli to TRB3
-            elif tribometer_type == tribometer_types[2]:  # "TRB3"
-
-                # # Znajdź najniższą wartość w kolumnie "µ"
-                #df = adjust_negative_offset(df, 'µ')
-
-                # Wybierz interesujące kolumny
-                df = df[['Distance [m]', 'µ', 'Penetration Depth [µm]']]
-            # Jeśli to Rtec
-            elif tribometer_type == tribometer_types[3]:  # "Rtec"
-                # Usuń powtarzające się te same liczby, więcej niż 5% zbioru danych (FIX)
-                df['DAQ.COF ()'] = replace_repeated_values(df['DAQ.COF ()'], 0.05)
-
-                # Obliczenie średniej ucinanej dla wartości bez pików - wymaga bo Rtec ma dużo pików --- µ ---
-                #df['DAQ.COF ()'] = replace_outliers(df['DAQ.COF ()'], 0.5)
-
-                # Zmień nazwy kolumny
-                df = df.rename(columns={'DAQ.COF ()': 'µ'})
-
-                # Konwersja XYZ.Z Position (mm) na um oraz obliczenie Distance [m] z Time [s]
-                df = Rtec_calculations(df, os.path.basename(file_path))
-
-                # Sortowanie rosnąco według 'Distance [m]' (usuwa dziwne anomalie w danych)
-                df = sort_dataframe_by_column(df, 'Distance [m]')
-                
-                # usuwanie danych poza zakresem - 1000 m maksymalny zakres jak nie będzie podany w nazwie pliku
-                df = remove_out_of_range_and_file_limit(df, 'Distance [m]', os.path.basename(file_path), 1000)
-
-                # Usunięcie peaków za pomocą odchylenia standardowego razy 3 --- µ ---
-                df['µ'] = remove_peaks_auto_limit(df['µ'], std_multiplier=3)
-
-                # Usunięcie peaków za pomocą odchylenia standardowego razy 2 --- Penetration Depth [µm] ---
-                df['Penetration Depth [µm]'] = remove_peaks_auto_limit(df['Penetration Depth [µm]'], std_multiplier=2)
-
-                # Wybierz interesujące kolumny
-                df = df[['Distance [m]', 'µ', 'Penetration Depth [µm]']]
-            else:
-                raise ValueError(f"\033[91m Brak funkcji programu typu [{mode}] dla tego tribometru: {tribometer_type} \033[0m")
-        # Jak nie Obrotowy czy Posuwisto-zwrotny
-        else:
-            raise ValueError(f"\033[91m Brak wykrytego poprawnie rodzaju ruchu lub nie zdefiniowany, dla: {file_path} \033[0m")
         return df, tribometer_type, mode
 
     except Exception as e:
@@ -747,6 +936,91 @@ def read_and_process_file(file_path):
         print(f"\033[91m Błąd podczas przetwarzania pliku: {file_path}:\n{e} (linia {last_lineno}) \033[0m")
         return None, None, None
 
+# Silnik uśredniania blokowego: średnie kolejnych bloków danych (0, k, 2k, ...) dla jednego lub wielu rozmiarów bloku
+def block_means(values, block_sizes, min_length=1):
+    """
+    Liczy średnie kolejnych bloków danych bez pętli po blokach w Pythonie.
+    Dla jednego rozmiaru bloku (int) sumy są liczone przez reshape pełnych bloków,
+    czyli tak samo jak mean() w pandas dla każdego bloku osobno. Dla wielu rozmiarów
+    naraz (tablica) średnie są liczone z jednej tablicy sum skumulowanych.
+    Wartości NaN nie są liczone do średnich, blok bez danych ma średnią NaN.
+
+    Args:
+        values (np.ndarray): Dane wejściowe (np. kolumna 'µ').
+        block_sizes (int | np.ndarray): Rozmiar bloku albo tablica rozmiarów bloków.
+        min_length (int): Minimalna liczba wierszy bloku, krótsze bloki są pomijane.
+
+    Returns:
+        tuple: (indeks rozmiaru bloku w block_sizes, początki bloków, średnie bloków)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    finite = ~np.isnan(values)
+    if np.ndim(block_sizes) == 0:
+        # Jeden rozmiar bloku: pełne bloki jako macierz [bloki x k] i ostatni niepełny blok
+        block_size = int(block_sizes)
+        starts = np.arange(0, n, block_size)
+        full_blocks = n // block_size
+        filled = np.where(finite, values, 0.0)
+        sums = np.empty(len(starts), dtype=np.float64)
+        counts = np.empty(len(starts), dtype=np.int64)
+        sums[:full_blocks] = filled[:full_blocks * block_size].reshape(full_blocks, block_size).sum(axis=1)
+        counts[:full_blocks] = finite[:full_blocks * block_size].reshape(full_blocks, block_size).sum(axis=1)
+        if full_blocks < len(starts):
+            sums[full_blocks] = filled[full_blocks * block_size:].sum()
+            counts[full_blocks] = finite[full_blocks * block_size:].sum()
+        size_index = np.zeros(len(starts), dtype=np.int64)
+        ends = np.minimum(starts + block_size, n)
+        reference = 0.0
+    else:
+        # Wiele rozmiarów bloku: sumy skumulowane (przesunięte o średnią, mniejszy błąd zaokrągleń)
+        block_sizes = np.asarray(block_sizes, dtype=np.int64)
+        reference = values[finite].mean() if finite.any() else 0.0
+        cumulative_sum = np.concatenate(([0.0], np.cumsum(np.where(finite, values - reference, 0.0))))
+        cumulative_count = np.concatenate(([0], np.cumsum(finite)))
+        # Wszystkie bloki wszystkich rozmiarów: numer rozmiaru, początek i koniec bloku
+        blocks_per_size = (n + block_sizes - 1) // block_sizes
+        size_index = np.repeat(np.arange(len(block_sizes)), blocks_per_size)
+        block_number = np.arange(len(size_index)) - np.repeat(np.cumsum(blocks_per_size) - blocks_per_size, blocks_per_size)
+        starts = block_number * block_sizes[size_index]
+        ends = np.minimum(starts + block_sizes[size_index], n)
+        sums = cumulative_sum[ends] - cumulative_sum[starts]
+        counts = cumulative_count[ends] - cumulative_count[starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    if reference:
+        means += reference  # Powrót z przesunięcia o średnią (tylko dla sum skumulowanych)
+    # Pomiń bloki krótsze niż min_length
+    use = (ends - starts) >= min_length
+
+    return size_index[use], starts[use], means[use]
+
+# Odchylenie standardowe średnich blokowych dla wielu rozmiarów bloku naraz
+def block_means_std(values, block_sizes):
+    """
+    Dla każdego rozmiaru bloku z block_sizes zwraca odchylenie standardowe (ddof=1)
+    średnich bloków (block_means). Bloki krótsze niż 2 wiersze (ostatni niepełny blok)
+    są pomijane, średnie NaN nie są liczone (jak std() w pandas).
+
+    Args:
+        values (np.ndarray): Dane wejściowe (np. kolumna 'µ').
+        block_sizes (np.ndarray): Rozmiary bloków (sample_average) do sprawdzenia.
+
+    Returns:
+        np.ndarray: std(średnich bloków) dla każdego rozmiaru, NaN gdy mniej niż 2 średnie.
+    """
+    size_index, _, means = block_means(values, np.atleast_1d(block_sizes), min_length=2)
+    finite = ~np.isnan(means)
+    size_index, means = size_index[finite], means[finite]
+    means_count = np.bincount(size_index, minlength=len(block_sizes))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means_mean = np.bincount(size_index, weights=means, minlength=len(block_sizes)) / means_count
+        squares = np.bincount(size_index, weights=(means - means_mean[size_index]) ** 2, minlength=len(block_sizes))
+        std = np.sqrt(squares / (means_count - 1))
+    std[means_count < 2] = np.nan
+
+    return std
+
 # Funkcja oblicza najlepszą wartość ilości uśredniania próbek dla przebiegu µ i pd
 #column_names = ['Distance [m]', 'µ', 'Penetration Depth [µm]']
 def find_optimal_samples_average(data, column_names, min_sample, max_sample):
@@ -754,45 +1028,19 @@ def find_optimal_samples_average(data, column_names, min_sample, max_sample):
     # Dla max_sample = 500, jeśli len(data) = 1000, to min_sample_average = 2.
     max_sample_average = max(1, len(data) // min_sample)  # Wyznacz górną granicę `sample_average` (MAX)
     # Dla min_sample = 100, jeśli len(data) = 1000, to max_sample_average = 10.
-    
-    best_sample_average_µ = None
-    best_sample_average_pd = None
-    best_std_µ = float('inf')
-    best_std_pd = float('inf')
-
-    # Przechodzimy przez różne wartości `sample_average`
-    for sample_average in range(min_sample_average, max_sample_average + 1):
-        averaged_data_list = []
-
-        # Tworzymy uśrednione dane
-        for i in range(0, len(data), sample_average):
-            subset = data.iloc[i:i+sample_average]
-            
-            if len(subset) < 2:
-                continue
-            
-            µ_avg = subset['µ'].mean()
-            pd_avg = subset['Penetration Depth [µm]'].mean()
 
-            averaged_data_list.append({
-                'Distance [m]': subset.iloc[0]['Distance [m]'],
-                'µ': µ_avg,
-                'Penetration Depth [µm]': pd_avg
-            })
-        
-        averaged_data = pd.DataFrame(averaged_data_list, columns=column_names)
-        std_µ = averaged_data['µ'].std()
-        std_pd = averaged_data['Penetration Depth [µm]'].std()
-
-        # Aktualizujemy najlepsze wartości `sample_average`
-        if std_µ < best_std_µ:
-            best_std_µ = std_µ
-            best_sample_average_µ = sample_average
-            
-        if std_pd < best_std_pd:
-            best_std_pd = std_pd
-            best_sample_average_pd = sample_average
-    
+    # Wszystkie wartości `sample_average` sprawdzane naraz
+    sample_averages = np.arange(min_sample_average, max_sample_average + 1)
+    best_sample_averages = []
+    for column_name in ('µ', 'Penetration Depth [µm]'):
+        std = block_means_std(data[column_name].to_numpy(dtype=np.float64), sample_averages)
+        # Najlepsza (pierwsza najmniejsza) wartość std, None gdy nie da się policzyć żadnej
+        if np.isnan(std).all():
+            best_sample_averages.append(None)
+        else:
+            best_sample_averages.append(int(sample_averages[np.nanargmin(std)]))
+    best_sample_average_µ, best_sample_average_pd = best_sample_averages
+
     return best_sample_average_µ, best_sample_average_pd  # Zwracamy krotkę (best_sample_average_µ, best_sample_average_pd)
 
 # Funkcja dokonuje korekty wykresu zużycia liniowego aby zaczynał się od zera
@@ -874,24 +1122,34 @@ def process_penetration_depth(df, data, percent, offset_raw, erase_peak, invert_
 
         elif erase_peak == 0 and invert_peak == 1: # (tylko dla wykresów powyżej lub równo z 0, czyli po korektach)
             # dodanie peaku jako inwersja i offset na początku danych
+            values = df['Penetration Depth [µm]'].to_numpy(dtype=np.float64, copy=True)
+            # Stała kolumna przy RangeIndex jest pomijana (pandas zwracał wtedy RangeIndex dla indeksów minimum)
+            constant_skip = isinstance(df.index, pd.RangeIndex)
             consecutive_zero_min_index = 0  # Licznik wystąpień min_index = 0
             # Pętla while jest po to aby kod wykonać do puki nie wygładzi się przebiegów pseudo-sinusoidalnych
             max_iterations = 50  # Limit maksymalnej liczby iteracji, aby zapobiec nieskończonej pętli
             iteration = 0
             while consecutive_zero_min_index < 3 and iteration < max_iterations:  # Warunek zakończenia pętli - POTRÓJNY check lub limit iteracji
-                min_value = df['Penetration Depth [µm]'].min()  # Znajdź najmniejszą wartość w kolumnie
-                min_index = df['Penetration Depth [µm]'].idxmin()  # Znajdź indeks najmniejszej wartości
-                end_index = df[df['Penetration Depth [µm]'] == min_value].index  # Ustal indeks najmniejszej wartości
-                if min_value <= 0 and not isinstance(end_index, pd.RangeIndex):  # Tylko dla wartości mniejszych od 0 i nie dla RangeIndex
-                    for i in range(len(end_index)):  # iterowanie po całym zakresie indeksów
-                        df.loc[:end_index[i], 'Penetration Depth [µm]'] *= -1  # Inwertuj wartości w kolumnie od 0 do pozycji end_index[i]
-                        min_value = df['Penetration Depth [µm]'].min()  # Znajdź najmniejszą wartość w kolumnie po inwersji
-                        df['Penetration Depth [µm]'] += abs(min_value)  # Offsetuj całe dane, aby najmniejsza wartość była większa bądź równa 0
-                if min_index == 0:  # Sprawdź, czy min_index jest równy 0
+                min_value = values.min()  # Znajdź najmniejszą wartość w kolumnie
+                min_position = values.argmin()  # Znajdź pozycję najmniejszej wartości
+                end_positions = np.flatnonzero(values == min_value)  # Ustal pozycje najmniejszej wartości
+                changed = False
+                if min_value <= 0 and not (constant_skip and len(end_positions) == len(values)):  # Tylko dla wartości mniejszych od 0
+                    previous_values = values.copy()
+                    for end_position in end_positions:  # iterowanie po całym zakresie pozycji
+                        values[:end_position + 1] *= -1  # Inwertuj wartości w kolumnie od 0 do pozycji end_position
+                        values += abs(values.min())  # Offsetuj całe dane, aby najmniejsza wartość była większa bądź równa 0
+                    # Zmiana sprawdzana bitowo (także -0.0 / 0.0)
+                    changed = not np.array_equal(previous_values.view(np.int64), values.view(np.int64))
+                if df.index[min_position] == 0:  # Sprawdź, czy min_index jest równy 0
                     consecutive_zero_min_index += 1  # Zwiększ licznik
                 else:
                     consecutive_zero_min_index = 0  # Zresetuj licznik, jeśli min_index nie jest równy 0
                 iteration += 1
+                # Bez zmian w danych kolejne iteracje dałyby ten sam wynik - koniec pętli
+                if not changed:
+                    break
+            df['Penetration Depth [µm]'] = values
 
         # Drugi raz offset wartości ujemnych (na wszelki wypadek) względem danych uśrednionych
         min_penetration_depth_4 = df['Penetration Depth [µm]'].min()  # Znajdź najmniejszą wartość
@@ -921,21 +1179,33 @@ def process_penetration_depth(df, data, percent, offset_raw, erase_peak, invert_
             df.loc[0, 'Penetration Depth [µm]'] = 0
         else:
             # Przypisz wartościom zerowym ostatnią znaną wartość powyżej zera
+            values = df['Penetration Depth [µm]'].to_numpy(dtype=np.float64, copy=True)
             # Znalezienie wartości 0 od indeksu 1 w kolumnie
-            min_values = df['Penetration Depth [µm]'].iloc[1:].min()  # Znajdź wartości 0 od indeksu 1
-            min_indexes = df[df['Penetration Depth [µm]'] == min_values].index  # Znajdź indeksy wszystkich wartości 0
-            for index in min_indexes:
-                if index > 0 and min_values == 0:  # Jeśli indeks większy od 0 i wartość minimalna równa 0
-                    # Znajdź następną wartość różną od 0
-                    next_nonzero_idx = df['Penetration Depth [µm]'].iloc[index + 1:].ne(0).idxmax()  # Indeks następnej wartości != 0
-                    if next_nonzero_idx > index:  # Jeśli istnieje następna wartość różna od 0
-                        prev_value = df['Penetration Depth [µm]'].iloc[index - 1]  # Wartość poprzednia
-                        next_value = df['Penetration Depth [µm]'].iloc[next_nonzero_idx]  # Wartość następna
-                        # Aproksymacja liniowa
-                        interpolated_value = prev_value + (next_value - prev_value) / (next_nonzero_idx - index)
-                        df.loc[index, 'Penetration Depth [µm]'] = interpolated_value  # Przypisanie aproksymowanej wartości
-                        print(f"Zinterpolowano wartość 'pd' dla indeksu {index + 1}: {interpolated_value:.1f}")  # Drukuj indeks human-readable
-            if erase_peak == 1 and min_indexes > 0: print("UWAGA! Usunięto zera po piku w 'pd', według configu użytkownika programu.") # Drukuj info
+            min_values = values[1:].min() if len(values) > 1 else np.nan  # Znajdź wartości 0 od indeksu 1
+            min_positions = np.flatnonzero(values == min_values)
+            min_indexes = df.index[min_positions]  # Znajdź indeksy wszystkich wartości 0
+            if min_values == 0:
+                # Pozycje wartości różnych od 0 (liczone raz - interpolowane są tylko pozycje przed szukanym zakresem)
+                nonzero_positions = np.flatnonzero(values != 0)
+                for position, index in zip(min_positions, min_indexes):
+                    if index > 0:  # Jeśli indeks większy od 0
+                        # Indeks danych używany jako pozycja, tak jak dotychczas (.iloc[index + 1:])
+                        search_start = index + 1
+                        if search_start >= len(values):  # Brak kolejnych próbek - nie ma czego interpolować
+                            continue
+                        # Znajdź następną wartość różną od 0 (gdy brak - pierwsza próbka zakresu)
+                        found = np.searchsorted(nonzero_positions, search_start)
+                        next_position = nonzero_positions[found] if found < len(nonzero_positions) else search_start
+                        next_nonzero_idx = df.index[next_position]  # Indeks następnej wartości != 0
+                        if next_nonzero_idx > index and next_nonzero_idx < len(values):  # Jeśli istnieje następna wartość różna od 0
+                            prev_value = values[index - 1]  # Wartość poprzednia
+                            next_value = values[next_nonzero_idx]  # Wartość następna
+                            # Aproksymacja liniowa
+                            interpolated_value = prev_value + (next_value - prev_value) / (next_nonzero_idx - index)
+                            values[position] = interpolated_value  # Przypisanie aproksymowanej wartości
+                            print(f"Zinterpolowano wartość 'pd' dla indeksu {index + 1}: {interpolated_value:.1f}")  # Drukuj indeks human-readable
+                df['Penetration Depth [µm]'] = values
+            if erase_peak == 1 and (min_indexes > 0).any(): print("UWAGA! Usunięto zera po piku w 'pd', według configu użytkownika programu.") # Drukuj info
         
         return df
 
@@ -946,37 +1216,19 @@ def adjust_and_average_data(df, best_sample_average, window_u, window_pd):
         print("\033[93m[WARNING] Nieprawidłowa wartość best_sample_average ("f"{best_sample_average}), ustawiono na 1!\033[0m")
         best_sample_average = 1
 
-    # Zainicjuj pustą listę na uśrednione dane
-    averaged_data_list = []
-
-    # Iteruj po zakresach danych co `best_sample_average` wierszy
-    for i in range(0, len(df), best_sample_average):
-        # Wybierz podzbiór danych dla danego zakresu
-        subset = df.iloc[i:i+best_sample_average]
-
-        # Oblicz średnią dla µ i Penetration Depth [µm] (dodatkowo zabezpieczenie 1: wartość µ nie może być ujemna)
-        µ_avg = subset['µ'].mean()
-        # if µ_avg < 0:
-        #     µ_avg = abs(µ_avg)
-        # TODO dodać obsługę nano tribometru (NTR) - TZN. współczynnik tarcia scgodzi na ujemne wartości, jaki fix? abs? offset?
-        pd_avg = subset['Penetration Depth [µm]'].mean()
-
-        # Dodaj uśrednione wartości do listy
-        averaged_data_list.append({
-            'Distance [m]': subset.iloc[0]['Distance [m]'],  # Zachowaj oryginalną wartość Distance [m]
-            'µ': µ_avg,
-            'Penetration Depth [µm]': pd_avg
-        })
+    # Średnie bloków co `best_sample_average` wierszy dla µ i Penetration Depth [µm] (silnik block_means)
+    # TODO dodać obsługę nano tribometru (NTR) - TZN. współczynnik tarcia scgodzi na ujemne wartości, jaki fix? abs? offset?
+    _, starts, µ_avg = block_means(df['µ'].to_numpy(dtype=np.float64), best_sample_average)
+    _, _, pd_avg = block_means(df['Penetration Depth [µm]'].to_numpy(dtype=np.float64), best_sample_average)
 
+    # Filtrowanie 'µ' z długością okna 'window_u' i 'Penetration Depth [µm]' z długością okna 'window_pd'
     # Stwórz DataFrame z uśrednionymi danymi
-    averaged_data = pd.DataFrame(averaged_data_list)
+    averaged_data = pd.DataFrame({
+        'Distance [m]': df['Distance [m]'].to_numpy(dtype=np.float64)[starts],  # Zachowaj oryginalną wartość Distance [m]
+        'µ': Savitzky(µ_avg, window_u),
+        'Penetration Depth [µm]': Savitzky(pd_avg, window_pd)
+    })
 
-    # Filtrowanie kolumny 'µ' z długością okna 'window_u'
-    averaged_data = Savitzky(averaged_data, 'µ', window_u)
-
-    # Filtrowanie kolumny 'Penetration Depth [µm]' z długością okna 'window_pd'
-    averaged_data = Savitzky(averaged_data, 'Penetration Depth [µm]', window_pd)
-    
     # Upewnij się, że w zerowej linii "µ" jest wartość 0
     if averaged_data.loc[0, 'µ'] != 0:
         # Przesuń wartości w kolumnie 'µ' w dół o 1
@@ -1046,251 +1298,1244 @@ def approximate_last_measurement(averaged_data, original_data):
 
     return averaged_data
 
-# Funkcja generująca wykresy z danych
-def generate_combined_xlsx(csv_files, output_xlsx, series_from_filename, chart_lang):
-    with pd.ExcelWriter(output_xlsx, engine='xlsxwriter') as writer:
-        col_offset = 0  # Przesunięcie kolumn na dane do wykresu (współrzędne do wykresów)
-        row_offset = 0  # Przesunięcie wiersza na wykresy
-        sheet_name = output_xlsx.replace('.xlsx', "")[:31]  # Nazwa arkusza danych (limit do 31 znaków)
-
-        # Ustawienie nazw osi w zależności od języka
-        if chart_lang == 'pl':
-            x_axis_label = 'Droga [m]'
-            y_axis_label_mu = 'Współczynnik tarcia'
-            y_axis_label_pd = 'Zużycie liniowe [µm]'
-        else:  # Domyślnie angielski
-            x_axis_label = 'Distance [m]'
-            y_axis_label_mu = 'Friction coefficient'
-            y_axis_label_pd = 'Linear wear [µm]'
-
-        for csv_file in csv_files:
-            # Wczytaj dane z pliku CSV do DataFrame
-            df = pd.read_csv(csv_file)  # Pobranie danych z plików .csv do Dataframe
-
-            # Zapisz dane z DataFrame do arkusza, z uwzględnieniem przesunięcia kolumn
-            df.to_excel(writer, sheet_name=sheet_name, index=False, startrow=2, startcol=col_offset)    
-
-            # Wyodrębnij nazwę pliku i tekst w nawiasach
-            filename = os.path.basename(csv_file)  # Nazwa pliku
-            match = re.search(r'\((.*?)\)', filename)  # szukaj nawiasu i danych w nim
-            text_in_brackets = match.group(1) if match else ""  # jak jest nawias to przypisz dane
-            cleaned_filename = filename.replace('.csv', "").replace('(', "").replace(')', "")  # usuń nawias z nazwy
-
-            # Uzyskaj obiekt worksheet
-            worksheet = writer.sheets[sheet_name]
-            # Info na początku pliku .xlsx
-            worksheet.write(0, col_offset, cleaned_filename) # nazwa bez nawiasów w pierwszej kolumnie
-
-            # Jeśli są dane w nawiasie, to zapisz je
-            series_name = text_in_brackets if match else filename
-            # Jeśli chcesz nazwę serii z nazwy pliku w nawiasie, to ją przypisz do serii
-            if series_from_filename == 1:
-                worksheet.write(1, col_offset + 2, series_name) # nazwa z zawartością nawiasów w trzeciej kolumnie
-                worksheet.write(1, col_offset + 1, series_name)
-
-            # Ustal maksymalną wartość dla osi X
-            x_axis_max = max(1, int(round(df['Distance [m]'].max())))
-            x_axis_max = (int((x_axis_max + 24) / 25)) * 25
-
-            # Dodaj wykres µ
-            if series_from_filename == 0: worksheet.write(1, col_offset + 1, 'µ')
-            chart = writer.book.add_chart({'type': 'scatter'})
-            chart.add_series({
-                'name': [sheet_name, 1, col_offset + 1],  # Nazwa serii z komórki 'µ'
-                'categories': [sheet_name, 3, col_offset, 3 + len(df) - 1, col_offset],  # Zakres dla osi X
-                'values': [sheet_name, 3, col_offset + 1, 3 + len(df) - 1, col_offset + 1],  # Zakres dla osi Y
-                'line': {'width': 2},  # Ciągła linia bez punktów
-                'marker': {'type': 'none'},  # Wyłącza wyświetlanie punktów
-            })
-            chart.set_title({'name': f"{cleaned_filename} - µ"})
-            chart.set_x_axis({
-                'name': x_axis_label,  # nazwa osi X zależna od języka
-                'min': 0,  # minimalna wartość osi X
-                'max': 100 if x_axis_max < 10 else x_axis_max,  # zakres
-                'major_unit': max(25, int(round(x_axis_max / 5.0))) if x_axis_max >= 10 else 2,  # podziałka
-                'major_gridlines': {'visible': True},  # dodaj pionowe kreski
-            })
-            chart.set_y_axis({
-                'name': y_axis_label_mu,  # nazwa osi Y zależna od języka
-            })
-            worksheet.insert_chart(f"B{25 + row_offset}", chart)
+# Zaokrąglenie do podanej liczby miejsc po przecinku tak jak zapis CSV z float_format='%.4f'
+def round_decimals(df, decimals=4):
+    scale = 10.0 ** decimals
+    rounded = df.copy()
+    for column in rounded.columns:
+        values = rounded[column].to_numpy(dtype=np.float64)
+        scaled = values * scale
+        result = np.rint(scaled) / scale
+        # Wartości bliskie połowie (błąd mnożenia) - dokładne zaokrąglenie dziesiętne jak przy formatowaniu tekstu
+        fraction = np.abs(scaled - np.floor(scaled) - 0.5)
+        ambiguous = np.flatnonzero((fraction < 1e-6) | (np.abs(scaled) >= 2.0 ** 52))
+        for position in ambiguous:
+            result[position] = float(f"{values[position]:.{decimals}f}")
+        rounded[column] = result
+    return rounded
+
+# Zapis wyników jednego pliku (obrobionych i RAW) jako pliki CSV w csv_folder, gdy podano folder
+def save_result_csv(result, csv_folder):
+    if csv_folder is None or result["data"] is None:
+        return
+    try:
+        result["data"].to_csv(os.path.join(csv_folder, result["output_file"]), index=False, float_format='%.4f')
+        result["data_raw"].to_csv(os.path.join(csv_folder, result["output_file_raw"]), index=False, float_format='%.4f')
+    except Exception as e:
+        print(f"\033[91mBłąd podczas zapisywania pliku {result['output_file']}: {e} \033[0m")
+
+# Pomiar etapu obróbki (profile = 1): czas, czas CPU, wiersze na wejściu i wyjściu (record["rows_out"] ustawiane
+# w bloku with) oraz szczyt zaalokowanej pamięci (profile = 2, tracemalloc - spowalnia obróbkę); records = None - bez pomiaru
+# Przed pomiarem: import modułów zewnętrznych (bez kosztu importu w pierwszym etapie) i start tracemalloc (memory)
+# progress - funkcja postępu (process_files), wywoływana na początku etapu ze zdarzeniem 'stage'
+def start_profiling(memory=False):
+    import_modules()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start() # Do końca procesu - tylko gdy włączony pomiar pamięci
+
+@contextlib.contextmanager
+def profile_stage(records, name, rows_in=None, progress=None):
+    record = {"stage": name, "rows_in": rows_in, "rows_out": None}
+    if progress is not None:
+        progress({"event": "stage", "stage": name, "rows": rows_in})
+    if records is None:
+        yield record
+        return
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    record["pid"] = os.getpid()
+    record["start_us"] = time.time() * 1e6
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_s"] = time.perf_counter() - start_wall
+        record["cpu_s"] = time.process_time() - start_cpu
+        record["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20 if tracemalloc.is_tracing() else None
+        records.append(record)
+
+# Tabela pomiarów etapów: każdy plik i suma etapów dla wszystkich plików (file_records - [(nazwa, pomiary)])
+def print_profile_summary(file_records):
+    print(f"\n{'Plik':<32} {'Etap':<30} {'Czas [s]':>9} {'CPU [s]':>9} {'Wiersze we':>11} {'Wiersze wy':>11} {'Pamięć [MB]':>11}")
+    totals = {}
+    for name, records in file_records:
+        for record in records:
+            peak = "" if record["peak_mb"] is None else f"{record['peak_mb']:.1f}"
+            print(f"{name[:32]:<32} {record['stage']:<30} {record['wall_s']:>9.3f} {record['cpu_s']:>9.3f} "
+                  f"{'' if record['rows_in'] is None else record['rows_in']:>11} {'' if record['rows_out'] is None else record['rows_out']:>11} {peak:>11}")
+            total = totals.setdefault(record["stage"], [0.0, 0.0])
+            total[0] += record["wall_s"]
+            total[1] += record["cpu_s"]
+    for stage, (wall, cpu) in totals.items():
+        print(f"{'RAZEM':<32} {stage:<30} {wall:>9.3f} {cpu:>9.3f}")
+
+# Zapis pomiarów w formacie Chrome trace-event JSON (chrome://tracing, Perfetto): etapy jako zdarzenia "X",
+# wiersz (tid) na proces roboczy, obróbka pliku jako zdarzenie obejmujące jego etapy
+def write_chrome_trace(path, file_records):
+    events = []
+    for name, records in file_records:
+        if not records:
+            continue
+        for record in records:
+            events.append({"name": record["stage"], "cat": "stage", "ph": "X", "pid": 1, "tid": record["pid"],
+                           "ts": record["start_us"], "dur": record["wall_s"] * 1e6,
+                           "args": {"file": name, "cpu_s": record["cpu_s"], "rows_in": record["rows_in"],
+                                    "rows_out": record["rows_out"], "peak_mb": record["peak_mb"]}})
+        start = min(record["start_us"] for record in records)
+        end = max(record["start_us"] + record["wall_s"] * 1e6 for record in records)
+        if len(records) > 1:
+            events.append({"name": name, "cat": "file", "ph": "X", "pid": 1, "tid": records[0]["pid"], "ts": start, "dur": end - start})
+    try:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, ensure_ascii=False)
+        print(f"Pomiary etapów zostały zapisane do pliku {path}")
+    except Exception as e:
+        print(f"\033[91mBłąd podczas zapisywania pliku {path}: {e} \033[0m")
 
-            # Dodaj wykres Penetration Depth [µm] (jeśli istnieje)
-            if 'Penetration Depth [µm]' in df.columns:
-                if series_from_filename == 0: worksheet.write(1, col_offset + 2, 'P.D. [µm]')
-                chart_pd = writer.book.add_chart({'type': 'scatter'})
-                chart_pd.add_series({
-                    'name': [sheet_name, 1, col_offset + 2],  # Nazwa serii z komórki 'P.D. [µm]'
-                    'categories': [sheet_name, 3, col_offset, 3 + len(df) - 1, col_offset],  # Zakres dla osi X
-                    'values': [sheet_name, 3, col_offset + 2, 3 + len(df) - 1, col_offset + 2],  # Zakres dla osi Y
-                    'line': {'width': 2},  # Ciągła linia bez punktów
-                    'marker': {'type': 'none'},  # Wyłącza wyświetlanie punktów
-                })
-                chart_pd.set_title({'name': f"{cleaned_filename} - Penetration Depth [µm]"})
-                chart_pd.set_x_axis({
-                    'name': x_axis_label,  # nazwa osi X zależna od języka
-                    'min': 0,  # minimalna wartość osi X
-                    'max': max(25, x_axis_max),  # zakres
-                    'major_unit': max(25, int(round(x_axis_max / 5.0))) if x_axis_max >= 10 else 2,  # podziałka
-                    'major_gridlines': {'visible': True},  # dodaj pionowe kreski
-                })
-                chart_pd.set_y_axis({
-                    'name': y_axis_label_pd,  # nazwa osi Y zależna od języka
-                })
-                worksheet.insert_chart(f"J{25 + row_offset}", chart_pd)
+# Pusty wynik obróbki pliku (nazwy wyników: nazwa pliku + ' .csv')
+def new_result(filename):
+    # Nazwa wyników odpowiadająca nazwie pliku tekstowego oryginalnego + spacja
+    output_file = os.path.splitext(filename)[0] + ' .csv'
+    output_file_raw = "raw_" + output_file # to samo co wyżej, ale z przedrostkiem "raw_"
+    return {"filename": filename, "processed": False, "output_file": output_file, "output_file_raw": output_file_raw, "data": None, "data_raw": None, "meta": None, "stages": None}
 
-            # Dodaj pustą kolumnę jako separator
-            col_offset += len(df.columns) + 1
-            # Aktualizuj offset wiersza
-            row_offset += 15
-    print(f"Dane zostały zapisane do pliku {output_xlsx}")
+# Pełna obróbka jednego pliku: wczytanie, uśrednianie, korekta zużycia liniowego i aproksymacja
+def process_file(file_path, settings, csv_folder=None, profile=0, progress=None):
+    """
+    Przetwarza jeden plik z tribometru. Wyniki (obrobione i RAW) zaokrąglone do 4 miejsc po przecinku
+    zwracane są w pamięci, a zapisywane jako pliki CSV tylko gdy podano csv_folder.
+    Błędy są wypisywane i nie przerywają przetwarzania pozostałych plików.
 
-def generate_combined_xlsx_2(csv_files=None, csv_files_raw=None, output_xlsx="default.xlsx", series_from_filename=0, chart_lang='en'):
-    # Sprawdź, czy przynajmniej jedno z csv_files lub csv_files_raw jest przekazane
-    if not csv_files and not csv_files_raw:
-        raise ValueError("At least one of 'csv_files' or 'csv_files_raw' must be provided.")
+    Args:
+        file_path (str): Ścieżka do pliku z danymi.
+        settings (dict): Parametry obróbki (offset_raw, erase_peak, invert_peak, default_window_length_u,
+            default_window_length_pd, min_sample, max_sample).
+        csv_folder (str): Folder na pliki CSV lub None.
+        profile (int): Pomiar etapów obróbki (profile_stage) zapisywany w wyniku ('stages'), 2 - także pamięci.
+        progress (callable): Funkcja postępu wywoływana ze zdarzeniami 'read' i 'stage' (z kluczem 'file').
+
+    Returns:
+        dict: {'filename', 'processed' - czy dane zostały przetworzone, 'output_file', 'output_file_raw' -
+        nazwy wyników (nazwa pliku + ' .csv'), 'data', 'data_raw' - DataFrame lub None, 'meta' - tribometr,
+        tryb, parametry z nazwy pliku i wybrane best_sample_average lub None, 'stages' - pomiary etapów}.
+    """
+    result = new_result(os.path.basename(file_path))
+    stages = result["stages"] = [] if profile else None
+    if profile:
+        start_profiling(memory=profile == 2)
+    report = None
+    if progress is not None:
+        def report(event):
+            progress(dict(event, file=file_path))
+    with profile_stage(stages, "read_and_process_file", progress=report) as record:
+        data, _, _ = read_and_process_file(file_path, report) # Wczytaj dane z plików
+        record["rows_out"] = None if data is None else len(data)
+    if data is None:
+        return result
+    process_tribometer_data(result, data, settings, stages, report, csv_folder, file_path)
+    return result
+
+# Obróbka wczytanych danych (read_and_process_file, prepare_tribometer_data) do wyniku process_file (result uzupełniany),
+# source - ścieżka lub nazwa danych w komunikatach błędów
+def process_tribometer_data(result, data, settings, stages=None, report=None, csv_folder=None, source=None):
+    tribometer_type, mode = tribometer_labels(data.attrs["tribometer"])
+    try:
+        # Przetwórz dane przy użyciu najlepszej wartości sample_average (do wyboru µ lub pd)
+        with profile_stage(stages, "find_optimal_samples_average", len(data), progress=report):
+            best_sample_average_µ, best_sample_average_pd = find_optimal_samples_average(data, column_names=['Distance [m]', 'µ', 'Penetration Depth [µm]'], min_sample=settings["min_sample"], max_sample=settings["max_sample"])
+        with profile_stage(stages, "adjust_and_average_data", len(data), progress=report) as record:
+            averaged_data = adjust_and_average_data(data, best_sample_average_µ, settings["default_window_length_u"], settings["default_window_length_pd"])
+            record["rows_out"] = len(averaged_data)
+        # Korekta zużycia liniowego (df=averaged_data, data=data, percent=0.05, offset_raw=0, erase_peak=0, invert_peak=1)
+        with profile_stage(stages, "process_penetration_depth", len(averaged_data), progress=report) as record:
+            averaged_data = process_penetration_depth(averaged_data, data, 0.05, settings["offset_raw"], settings["erase_peak"], settings["invert_peak"])
+            record["rows_out"] = len(averaged_data)
+        # Approximate the last value
+        with profile_stage(stages, "approximate_last_measurement", len(averaged_data), progress=report) as record:
+            approximated_data = approximate_last_measurement(averaged_data, data)
+            record["rows_out"] = len(approximated_data)
+        # Metadane wyniku (zapis do _arrays)
+        result["meta"] = {"version": __version__, "source": result["filename"], "tribometer": data.attrs["tribometer"]["name"], "mode": data.attrs["tribometer"]["mode"],
+                          "file_params": data.attrs["file_params"], "best_sample_average_µ": best_sample_average_µ,
+                          "best_sample_average_pd": best_sample_average_pd, "settings": settings}
+    except Exception as e:
+        last_lineno = traceback.extract_tb(sys.exc_info()[2])[-1].lineno
+        print(f"\033[91m Błąd podczas przetwarzania pliku: {source or result['filename']}:\n{e} (linia {last_lineno}) \033[0m")
+        result["error"] = f"{e} (linia {last_lineno})" # Opis błędu dla process_data
+        return result
+    result["processed"] = True
     
-    with pd.ExcelWriter(output_xlsx, engine='xlsxwriter') as writer:
-        col_offset = 0  # Przesunięcie kolumn na dane do wykresu (współrzędne do wykresów)
+    if data.attrs["tribometer"]["name"] == "Nano": # "Nano" - usuń kolumnę pd dla nano tribometru
+        approximated_data = approximated_data.drop(columns=['Penetration Depth [µm]']) # z obrobionych
+        data = data.drop(columns=['Penetration Depth [µm]']) # z raw
+
+    # Wyniki zaokrąglone raz, do 4 miejsc po przecinku (jak w plikach CSV)
+    with profile_stage(stages, "round_decimals", len(approximated_data) + len(data), progress=report) as record:
+        result["data"] = round_decimals(approximated_data.reset_index(drop=True)) # finalne dane wyjściowe
+        result["data_raw"] = round_decimals(data.reset_index(drop=True)) # dane tylko wstępnie obrobione
+        record["rows_out"] = len(result["data"]) + len(result["data_raw"])
+
+    # Zapisz wynik do pliku CSV w csv_folder (opcja keep_csv)
+    save_result_csv(result, csv_folder)
+
+    # Calculate and print the mean value for µ data column
+    if "µ" in approximated_data.columns:
+        mu_mean = approximated_data["µ"].mean()
+    else:
+        mu_mean = float('nan')
+    print(f"[{tribometer_type}][{mode}] Wartość średnia dla 'µ': {mu_mean:.3f}")
+    return result
+
+# Obróbka pliku w procesie roboczym - komunikaty zbierane w buforze i wypisywane w całości przez main
+def process_file_buffered(file_path, settings, csv_folder=None, profile=0, progress=None):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = process_file(file_path, settings, csv_folder, profile, progress)
+    result["output"] = output.getvalue()
+    return result
+
+# API do importu (np. z usługi akwizycji): obróbka jednego testu w pamięci, bez komunikatów na konsoli,
+# bez folderu bieżącego i bez plików tymczasowych - process_data(...)
+# Parametry obróbki przyjmowane, gdy nie podano ich w settings (jak wartości domyślne load_config)
+DEFAULT_SETTINGS = {
+    "offset_raw": 1,
+    "erase_peak": 0,
+    "invert_peak": 0,
+    "default_window_length_u": 7,
+    "default_window_length_pd": 5,
+    "min_sample": 100,
+    "max_sample": 110
+}
+ANSI_ESCAPE_PATTERN = re.compile(r"\033\[[0-9;]*m")
+
+# Wpis z TRIBOMETER_FORMATS: wpis (dict), nazwa ('T11', 'Rtec' - jeden tryb), nazwa i tryb ('Nano Linear', ('TRB3', 'Rotary'))
+def find_tribometer_format(tribometer):
+    if isinstance(tribometer, dict):
+        return tribometer
+    name, mode = (tribometer.split() + [None])[:2] if isinstance(tribometer, str) else tribometer
+    matches = [tribometer_format for tribometer_format in TRIBOMETER_FORMATS if tribometer_format["name"].lower() == str(name).lower()
+               and (mode is None or tribometer_format["mode"].lower() == str(mode).lower())]
+    if len(matches) != 1:
+        available = ", ".join(f"{tribometer_format['name']} {tribometer_format['mode']}" for tribometer_format in TRIBOMETER_FORMATS)
+        raise ValueError(f"Nieznany lub niejednoznaczny format tribometru: {tribometer} (dostępne: {available})")
+    return matches[0]
+
+# Dane surowe z tablic (kolumny 'keep' formatu tribometru): słownik {kolumna: tablica}, DataFrame lub tablica 2D
+# Wiersz z wartością, która nie jest skończoną liczbą, jest pomijany i liczony jako niepoprawny (jak w plikach)
+def array_values(source, tribometer_format):
+    columns = tribometer_format["keep"]
+    if isinstance(source, dict) or isinstance(source, pd.DataFrame):
+        missing = [column for column in columns if column not in source]
+        if missing:
+            raise ValueError(f"Brak kolumn {missing} dla {tribometer_format['name']} {tribometer_format['mode']} (wymagane: {columns})")
+        values = np.column_stack([np.asarray(source[column], dtype=np.float64) for column in columns])
+    else:
+        values = np.asarray(source, dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] != len(columns):
+            raise ValueError(f"Tablica danych musi mieć kształt (wiersze, {len(columns)}) - kolumny {columns}, podano {values.shape}")
+    valid_mask = np.isfinite(values).all(axis=1)
+    valid_rows = int(valid_mask.sum())
+    return values[valid_mask], valid_rows, len(values) - valid_rows
+
+# Źródło danych tekstowych jako plik do read_tribometer_data: plik otwarty binarnie od początku (mmap) lub io.BytesIO
+def source_file(source, stack):
+    if isinstance(source, (str, os.PathLike)):
+        return stack.enter_context(open(source, "rb"))
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, io.BytesIO):
+        return source if source.tell() == 0 else io.BytesIO(source.getbuffer()[source.tell():])
+    if not isinstance(source, io.TextIOBase):
+        try:
+            if source.seekable() and source.tell() == 0:
+                source.fileno() # Plik na dysku - mapowany do pamięci
+                return source
+        except (AttributeError, OSError, ValueError):
+            pass
+    content = source.read()
+    return io.BytesIO(content.encode("utf-8") if isinstance(content, str) else content)
+
+def process_data(source, tribometer=None, settings=None, file_name=None, file_params=None, profile=0, progress=None):
+    """
+    Przetwarza jeden test w pamięci, tak jak process_file, ale bez wypisywania komunikatów (zbierane są
+    w diagnostyce), bez zależności od folderu bieżącego i bez zapisu plików.
+    Komunikaty są przechwytywane przez przekierowanie sys.stdout na czas obróbki, więc przy wywołaniach
+    z wielu wątków naraz do diagnostyki mogą trafić komunikaty innych wątków (do obróbki równoległej - procesy).
+
+    Args:
+        source: Dane testu:
+            - ścieżka do pliku (str, os.PathLike), bytes / bytearray / memoryview z zawartością pliku
+              albo obiekt plikowy (binarny lub tekstowy) - format wykrywany po nagłówku jak dla plików,
+            - dane surowe: słownik {kolumna: tablica}, DataFrame lub tablica 2D z kolumnami 'keep'
+              formatu tribometru (np. dla Nano Rotary: 'Distance [m]', 'µ') - wymagany tribometer.
+        tribometer: Format tribometru (find_tribometer_format): nazwa ('T11', 'Rtec'), nazwa i tryb
+            ('Nano Linear', ('TRB3', 'Rotary')) lub wpis z TRIBOMETER_FORMATS. Dla danych tekstowych
+            opcjonalny - wykryty format musi się z nim zgadzać.
+        settings (dict): Parametry obróbki jak w process_file, brakujące z DEFAULT_SETTINGS.
+        file_name (str): Nazwa pliku - parametry testu (parse_file_parameters, prędkość i obciążenie dla Rtec
+            i T11) oraz nazwa wyniku, domyślnie nazwa pliku ze ścieżki lub 'data'.
+        file_params (dict): Parametry testu ('speed', 'load', 'distance_limit') nadpisujące odczytane z file_name.
+        profile (int): Pomiar etapów obróbki jak w process_file (diagnostyka 'stages').
+        progress (callable): Funkcja postępu wywoływana ze zdarzeniami 'read' i 'stage' (klucz 'file' - file_name).
+
+    Returns:
+        dict: {'processed' - obrobione dane, 'raw' - dane tylko wstępnie obrobione: {kolumna: np.ndarray} lub None,
+        'meta' - jak w process_file, 'data', 'data_raw' - te same dane jako DataFrame, 'diagnostics':
+        {'ok' - czy dane zostały przetworzone, 'error' - opis błędu lub None, 'valid_rows', 'invalid_rows' -
+        wiersze danych surowych, 'messages' - komunikaty obróbki (bez kodów kolorów), 'stages' - pomiary etapów}}.
+        Błędy danych (brak pliku lub nagłówka, brak kolumn, brak poprawnych wierszy, błąd obróbki) są zwracane
+        w diagnostyce, błędne argumenty (nieznany format tribometru lub parametry obróbki) - ValueError.
+    """
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    unknown = sorted(set(settings) - set(DEFAULT_SETTINGS))
+    if unknown:
+        raise ValueError(f"Nieznane parametry obróbki: {unknown}")
+    tribometer_format = find_tribometer_format(tribometer) if tribometer is not None else None
+    is_text = isinstance(source, (str, os.PathLike, bytes, bytearray, memoryview)) or hasattr(source, "read")
+    if not is_text and tribometer_format is None:
+        raise ValueError("Dla danych z tablic wymagany jest format tribometru (tribometer)")
+    if file_name is None:
+        file_name = os.path.basename(os.fspath(source)) if isinstance(source, (str, os.PathLike)) else "data"
+    params = parse_file_parameters(file_name)
+    params.update(file_params or {})
+
+    result = new_result(file_name)
+    stages = result["stages"] = [] if profile else None
+    if profile:
+        start_profiling(memory=profile == 2)
+    report = None
+    if progress is not None:
+        def report(event):
+            progress(dict(event, file=file_name))
+    diagnostics = {"ok": False, "error": None, "valid_rows": 0, "invalid_rows": 0, "messages": [], "stages": stages}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            with profile_stage(stages, "read_tribometer_data", progress=report) as record:
+                if is_text:
+                    with contextlib.ExitStack() as stack:
+                        detected, values, valid_rows, invalid_rows = read_tribometer_data(source_file(source, stack), report)
+                    if detected is None:
+                        raise ValueError("Nie znaleziono odpowiedniej linii rozpoczynającej dane")
+                    if tribometer_format is not None and tribometer_format is not detected:
+                        raise ValueError(f"Wykryty format danych {detected['name']} {detected['mode']} jest inny niż podany "
+                                         f"{tribometer_format['name']} {tribometer_format['mode']}")
+                    tribometer_format = detected
+                else:
+                    values, valid_rows, invalid_rows = array_values(source, tribometer_format)
+                diagnostics["valid_rows"], diagnostics["invalid_rows"] = valid_rows, invalid_rows
+                record["rows_out"] = valid_rows
+            if valid_rows == 0:
+                raise ValueError("Brak poprawnych danych")
+            with profile_stage(stages, "prepare_tribometer_data", valid_rows, progress=report) as record:
+                data = prepare_tribometer_data(values, tribometer_format, params)
+                record["rows_out"] = len(data)
+        except Exception as e:
+            diagnostics["error"] = ANSI_ESCAPE_PATTERN.sub("", str(e)).strip()
+        else:
+            process_tribometer_data(result, data, settings, stages, report, source=file_name)
+    diagnostics["messages"] = [line.strip() for line in ANSI_ESCAPE_PATTERN.sub("", output.getvalue()).splitlines() if line.strip()]
+    diagnostics["ok"] = result["processed"]
+    if diagnostics["error"] is None and not result["processed"]:
+        diagnostics["error"] = ANSI_ESCAPE_PATTERN.sub("", result.get("error", "Błąd obróbki danych")).strip()
+    return {
+        "processed": None if result["data"] is None else {column: result["data"][column].to_numpy() for column in result["data"].columns},
+        "raw": None if result["data_raw"] is None else {column: result["data_raw"][column].to_numpy() for column in result["data_raw"].columns},
+        "meta": result["meta"],
+        "data": result["data"],
+        "data_raw": result["data_raw"],
+        "diagnostics": diagnostics
+    }
+
+# Pamięć podręczna wyników (cache): jeden folder na wynik z danymi .npy i meta.json (save_arrays, load_arrays - bez
+# pickle, więc wpis podrzucony do folderu _cache nie może uruchomić kodu), klucz z zawartości pliku, jego nazwy
+# (parametry Rtec i T11), parametrów obróbki, wersji programu i struktury wyniku, usuwanie najdawniej używanych (LRU)
+CACHE_FOLDER = "_cache"
+CACHE_FORMAT = 3 # Zwiększany przy zmianie struktury wyniku process_file lub zapisu wpisu
+CACHE_RESULT_KEYS = ("filename", "processed", "output_file", "output_file_raw", "output") # Pola wyniku poza danymi i meta
+
+def cache_key(file_path, settings):
+    digest = hashlib.sha256()
+    header = {"version": __version__, "format": CACHE_FORMAT, "filename": os.path.basename(file_path), "settings": settings}
+    digest.update(json.dumps(header, sort_keys=True).encode("utf-8"))
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_load(cache_folder, key):
+    folder = os.path.join(cache_folder, key)
+    try:
+        arrays = load_arrays(folder, mmap_mode=None)
+        meta = arrays["meta"]
+        result = {name: meta["cache"][name] for name in CACHE_RESULT_KEYS}
+        result["meta"] = {name: value for name, value in meta.items() if name not in ("arrays", "cache")}
+        result["data"] = pd.DataFrame(arrays["processed"])
+        result["data_raw"] = pd.DataFrame(arrays["raw"])
+        result["stages"] = None
+        os.utime(os.path.join(folder, "meta.json")) # Czas ostatniego użycia dla LRU
+        return result
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Uszkodzony wpis - usuń go, plik zostanie przetworzony ponownie
+        shutil.rmtree(folder, ignore_errors=True)
+        return None
+
+def cache_store(cache_folder, key, result, max_size_mb):
+    folder = os.path.join(cache_folder, key)
+    try:
+        # Zapis do folderu tymczasowego i zamiana nazwy - wpis jest kompletny albo go nie ma
+        shutil.rmtree(folder + ".tmp", ignore_errors=True)
+        save_arrays(folder + ".tmp", result, extra={"cache": {name: result.get(name) for name in CACHE_RESULT_KEYS}})
+        shutil.rmtree(folder, ignore_errors=True)
+        os.replace(folder + ".tmp", folder)
+    except Exception as e:
+        shutil.rmtree(folder + ".tmp", ignore_errors=True)
+        print(f"\033[38;5;214m Nie udało się zapisać wyniku w pamięci podręcznej: {e} \033[0m")
+        return
+    cache_evict(cache_folder, max_size_mb)
+
+def cache_evict(cache_folder, max_size_mb):
+    entries = []
+    for entry in os.scandir(cache_folder):
+        if entry.is_dir() and not entry.name.endswith(".tmp"):
+            try:
+                files = list(os.scandir(entry.path))
+                last_used = os.stat(os.path.join(entry.path, "meta.json")).st_mtime
+            except OSError:
+                last_used = 0 # Niekompletny wpis - usuwany w pierwszej kolejności
+                files = []
+            entries.append((last_used, sum(file.stat().st_size for file in files), entry.path))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries): # Od najdawniej używanych
+        if total_size <= max_size_mb * 1024 * 1024:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= size
+
+# Wyczyszczenie pamięci podręcznej, także wpisów pickle (.pkl) z wcześniejszych wersji - usuwane bez odczytu
+def cache_clear(cache_folder):
+    if not os.path.isdir(cache_folder):
+        return
+    for entry in os.scandir(cache_folder):
+        if entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.name.endswith((".pkl", ".tmp")):
+            with contextlib.suppress(OSError):
+                os.remove(entry.path)
+
+# Postęp obróbki: zdarzenia (słowniki) przekazywane do funkcji progress(event) z process_files
+# Zdarzenia z obróbki pliku: 'read' po każdej porcji parsera (bajty i wiersze przeczytane), 'stage' na początku
+# etapu, z process_files: 'file_done' po każdym pliku i 'batch_done' na końcu. progress_tracker uzupełnia je
+# o przepustowość i szacowany czas do końca pliku i całej obróbki, zdarzenia z procesów roboczych trafiają
+# do procesu głównego przez kolejkę. Zdarzenia są rzadkie (porcja parsera, etap), bez kosztu w pętlach obróbki.
+PROGRESS_INTERVAL = 0.1 # Odstęp odbioru zdarzeń z procesów roboczych i odświeżania paska postępu w sekundach
+PROGRESS_QUEUE = None # Kolejka zdarzeń w procesie roboczym (progress_worker_init)
+
+def progress_tracker(file_paths, callback):
+    """
+    Tworzy funkcję, która uzupełnia zdarzenia postępu i przekazuje je do callback.
+
+    Args:
+        file_paths (list): Pliki obróbki (rozmiary plików to całkowita liczba bajtów).
+        callback (callable): Funkcja wywoływana z uzupełnionym zdarzeniem.
+
+    Returns:
+        callable: Funkcja report(event) dla zdarzeń z kluczem 'file' ('batch_done' - bez pliku).
+        Zdarzenie uzupełnione o: 'index', 'total_files', 'bytes_done', 'bytes_total', 'rows', 'stage',
+        'elapsed_s', 'rows_per_s', 'mb_per_s', 'percent', 'eta_s' - dla pliku, oraz 'batch_files_done',
+        'batch_bytes_done', 'batch_bytes_total', 'batch_mb_per_s', 'batch_percent', 'batch_eta_s' - dla całości.
+        Prędkości i czasy do końca None, gdy nie da się ich jeszcze oszacować.
+    """
+    sizes = {}
+    for file_path in file_paths:
+        try:
+            sizes[file_path] = os.path.getsize(file_path)
+        except OSError:
+            sizes[file_path] = 0
+    index = {file_path: idx for idx, file_path in enumerate(file_paths, start=1)}
+    # Pliki z pamięci podręcznej (bez zdarzeń obróbki) są odejmowane od całości, aby nie zawyżać prędkości
+    batch = {"start": time.perf_counter(), "bytes_total": sum(sizes.values()), "bytes_done": 0, "files_done": 0, "seconds": 0.0, "bytes": 0}
+    files = {}
+
+    def report(event):
+        now = time.perf_counter()
+        file_path = event.get("file")
+        state = files.get(file_path)
+        if state is None and file_path is not None:
+            state = files[file_path] = {"start": now, "bytes_done": 0, "rows": 0, "stage": None, "started": event["event"] != "file_done"}
+        if event["event"] == "read":
+            state["bytes_done"] = event["bytes_done"]
+            state["rows"] = event["rows"]
+        elif event["event"] == "stage":
+            state["stage"] = event["stage"]
+        elif event["event"] == "file_done":
+            size = sizes.get(file_path, 0)
+            state["bytes_done"] = size
+            batch["files_done"] += 1
+            if state["started"]:
+                batch["bytes_done"] += size
+                batch["seconds"] += now - state["start"]
+                batch["bytes"] += size
+            else:
+                batch["bytes_total"] -= size
+            del files[file_path]
+
+        # Całość: pliki zakończone i bajty przeczytane z plików w trakcie obróbki, prędkość według czasu od startu
+        batch_elapsed = now - batch["start"]
+        batch_bytes_done = batch["bytes_done"] + sum(item["bytes_done"] for item in files.values())
+        batch_rate = batch_bytes_done / batch_elapsed if batch_bytes_done > 0 and batch_elapsed > 0 else None
+        full = dict(event)
+        full.update({
+            "total_files": len(file_paths),
+            "batch_files_done": batch["files_done"],
+            "batch_bytes_done": batch_bytes_done,
+            "batch_bytes_total": batch["bytes_total"],
+            "batch_mb_per_s": None if batch_rate is None else batch_rate / 2 ** 20,
+            "batch_percent": 100.0 * batch_bytes_done / batch["bytes_total"] if batch["bytes_total"] > 0 else 100.0,
+            "batch_eta_s": None if batch_rate is None else max(batch["bytes_total"] - batch_bytes_done, 0) / batch_rate
+        })
+        if file_path is not None:
+            size = sizes.get(file_path, 0)
+            elapsed = now - state["start"]
+            # Czas na bajt z plików zakończonych (wszystkie etapy), dla pierwszego pliku - z prędkości odczytu
+            if batch["bytes"] > 0:
+                seconds_per_byte = batch["seconds"] / batch["bytes"]
+            elif state["bytes_done"] > 0 and elapsed > 0:
+                seconds_per_byte = elapsed / state["bytes_done"]
+            else:
+                seconds_per_byte = None
+            full.update({
+                "index": index.get(file_path),
+                "bytes_done": state["bytes_done"],
+                "bytes_total": size,
+                "rows": state["rows"],
+                "stage": state["stage"],
+                "elapsed_s": elapsed,
+                "rows_per_s": state["rows"] / elapsed if state["rows"] and elapsed > 0 else None,
+                "mb_per_s": state["bytes_done"] / elapsed / 2 ** 20 if state["bytes_done"] and elapsed > 0 else None,
+                "percent": 100.0 * state["bytes_done"] / size if size > 0 else 100.0,
+                "eta_s": 0.0 if event["event"] == "file_done" else None if seconds_per_byte is None else max(size * seconds_per_byte - elapsed, 0.0)
+            })
+        callback(full)
+    return report
+
+# Procesy robocze: zdarzenia postępu wysyłane kolejką do procesu głównego (progress_drain)
+def progress_worker_init(progress_queue):
+    global PROGRESS_QUEUE
+    PROGRESS_QUEUE = progress_queue
+
+def progress_to_queue(event):
+    PROGRESS_QUEUE.put(event)
+
+def progress_drain(progress_queue, report):
+    while True:
+        try:
+            event = progress_queue.get_nowait()
+        except queue.Empty:
+            return
+        report(event)
+
+# Pasek postępu w konsoli (stderr, jedna linia odświeżana co PROGRESS_INTERVAL), czyszczony po każdym pliku,
+# aby komunikaty obróbki były wypisywane od początku linii
+def progress_bar(stream=None, width=10):
+    state = {"last": 0.0}
+
+    def show(event):
+        output = stream or sys.stderr
+        now = time.perf_counter()
+        if event["event"] in ("file_done", "batch_done"):
+            output.write("\r\033[K")
+            output.flush()
+            state["last"] = 0.0
+            return
+        if now - state["last"] < PROGRESS_INTERVAL:
+            return
+        state["last"] = now
+        filled = int(width * min(event["percent"], 100.0) / 100)
+        text = f"[{event['index']}/{event['total_files']}] [{'#' * filled}{'.' * (width - filled)}] {event['percent']:3.0f}%"
+        if event["mb_per_s"] is not None:
+            text += f" {event['mb_per_s']:.1f} MB/s"
+        if event["rows_per_s"] is not None:
+            text += f" {event['rows_per_s'] / 1000:.0f}k wierszy/s"
+        if event["eta_s"] is not None:
+            text += f" ETA {event['eta_s']:.0f} s"
+        text += f" | całość {event['batch_percent']:3.0f}%"
+        if event["batch_eta_s"] is not None:
+            text += f" ETA {event['batch_eta_s']:.0f} s"
+        text += f" | {event['stage'] or ''}" # Nazwa etapu na końcu - ucinana w wąskiej konsoli
+        columns = shutil.get_terminal_size().columns - 1
+        output.write("\r\033[K" + text[:columns])
+        output.flush()
+    return show
+
+# Ponowna obróbka pliku w osobnej puli z jednym procesem, po awarii procesu roboczego (BrokenProcessPool)
+# Awaria psuje całą pulę, a dopiero obróbka osobno wskazuje, czy winny jest ten plik
+def process_file_isolated(file_path, settings, csv_folder=None, profile=0, progress=None, pool_options=None):
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, **(pool_options or {})) as executor:
+            return executor.submit(process_file_buffered, file_path, settings, csv_folder, profile, progress).result()
+    except Exception as e:
+        return {"filename": os.path.basename(file_path), "processed": False, "data": None, "data_raw": None, "stages": None,
+                "output": f"\033[91m Błąd podczas przetwarzania pliku: {file_path}:\n{e} \033[0m\n"}
+
+# Obróbka wszystkich plików - kolejno albo w puli procesów (workers: 0 - wszystkie rdzenie, 1 - bez puli)
+# Wyniki i komunikaty zawsze w kolejności listy plików, tak jak przy obróbce kolejnej
+# Awaria procesu roboczego dotyczy tylko pliku, który ją powoduje (process_file_isolated i nowa pula dla pozostałych)
+# Z pamięcią podręczną (cache = {'folder', 'size_mb'}) przetwarzane są tylko pliki nowe lub zmienione
+# profile - pomiar etapów obróbki (bez pomiarów dla wyników z pamięci podręcznej)
+# progress - funkcja postępu wywoływana ze zdarzeniami uzupełnionymi przez progress_tracker, np. progress_bar()
+def process_files(file_paths, settings, workers=0, csv_folder=None, cache=None, profile=0, progress=None):
+    total_files = len(file_paths)
+    keys = [None] * total_files
+    cached = [None] * total_files
+    if cache is not None:
+        for position, file_path in enumerate(file_paths):
+            try:
+                keys[position] = cache_key(file_path, settings)
+            except OSError:
+                continue
+            cached[position] = cache_load(cache["folder"], keys[position])
+    pending = [file_path for file_path, result in zip(file_paths, cached) if result is None]
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(pending))
+    if workers > 1:
+        print(f"Przetwarzanie równoległe, liczba procesów: {workers}")
+    report = progress_tracker(file_paths, progress) if progress is not None else None
+    progress_queue = None
+    pool_options = {}
+    if report is not None and workers > 1:
+        progress_queue = multiprocessing.Queue()
+        pool_options = {"initializer": progress_worker_init, "initargs": (progress_queue,)}
+    worker_progress = progress_to_queue if progress_queue is not None else None
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, **pool_options) if workers > 1 else None
+    futures = {}
+    try:
+        if executor is not None:
+            futures = {file_path: executor.submit(process_file_buffered, file_path, settings, csv_folder, profile, worker_progress) for file_path in pending}
+        for idx, file_path in enumerate(file_paths, start=1):
+            print(f"\n[{idx}/{total_files}] Plik: {os.path.basename(file_path)} ...")
+            result = cached[idx - 1]
+            if result is not None:
+                if report is not None:
+                    report({"event": "file_done", "file": file_path, "processed": result["processed"]})
+                print("Wynik z pamięci podręcznej (plik bez zmian)")
+                print(result["output"], end="")
+                save_result_csv(result, csv_folder)
+                yield result
+                continue
+            if executor is None:
+                if cache is None and report is None:
+                    result = process_file(file_path, settings, csv_folder, profile)
+                else:
+                    # Komunikaty zbierane, aby odtworzyć je przy odczycie z pamięci podręcznej
+                    # i nie przerywać paska postępu
+                    result = process_file_buffered(file_path, settings, csv_folder, profile, report)
+            else:
+                future = futures[file_path]
+                # Odbiór zdarzeń postępu z procesów roboczych w trakcie oczekiwania na wynik pliku
+                while progress_queue is not None and not future.done():
+                    concurrent.futures.wait([future], timeout=PROGRESS_INTERVAL)
+                    progress_drain(progress_queue, report)
+                try:
+                    result = future.result()
+                except concurrent.futures.process.BrokenProcessPool:
+                    # Proces roboczy zakończył się awarią i pula nie działa: ten plik jeszcze raz osobno,
+                    # pliki niezakończone do nowej puli (wyniki już gotowe zostają)
+                    executor.shutdown(wait=True)
+                    result = process_file_isolated(file_path, settings, csv_folder, profile, worker_progress, pool_options)
+                    unfinished = [path for path in file_paths[idx:] if path in futures and (not futures[path].done() or futures[path].exception() is not None)]
+                    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, **pool_options)
+                    futures.update({path: executor.submit(process_file_buffered, path, settings, csv_folder, profile, worker_progress) for path in unfinished})
+                except Exception as e:
+                    # Inny błąd procesu roboczego (np. wynik, którego nie da się przesłać) dotyczy tylko tego pliku
+                    result = {"filename": os.path.basename(file_path), "processed": False, "data": None, "data_raw": None, "stages": None,
+                              "output": f"\033[91m Błąd podczas przetwarzania pliku: {file_path}:\n{e} \033[0m\n"}
+                if progress_queue is not None:
+                    progress_drain(progress_queue, report)
+            if report is not None:
+                report({"event": "file_done", "file": file_path, "processed": result["processed"]})
+            if "output" in result:
+                print(result["output"], end="")
+            if cache is not None and keys[idx - 1] is not None and result["processed"]:
+                cache_store(cache["folder"], keys[idx - 1], dict(result, stages=None), cache["size_mb"])
+            yield result
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if report is not None:
+        report({"event": "batch_done"})
+
+# Zapis wyników w formacie kolumnowym: folder _arrays/<nazwa pliku z rozszerzeniem>/ z processed.npy i raw.npy (float64,
+# kolumny ciągłe w pamięci - np.load(..., mmap_mode='r')), processed.parquet i raw.parquet (gdy jest pyarrow)
+# oraz meta.json (kolumny, liczba wierszy, tribometr, tryb, parametry z nazwy pliku, best_sample_average)
+ARRAYS_FOLDER = "_arrays"
+
+def parquet_available():
+    try:
+        import pyarrow # Opcjonalny, tylko dla plików .parquet
+    except ImportError:
+        return False
+    return True
+
+# Zapis danych wyniku do folderu (także wpisy pamięci podręcznej), extra - dodatkowe pola meta.json
+def save_arrays(folder, result, parquet=False, extra=None):
+    os.makedirs(folder, exist_ok=True)
+    meta = dict(result["meta"] or {}, arrays={}, **(extra or {}))
+    for key, df in (("processed", result["data"]), ("raw", result["data_raw"])):
+        np.save(os.path.join(folder, key + ".npy"), np.asfortranarray(df.to_numpy(dtype=np.float64)))
+        meta["arrays"][key] = {"npy": key + ".npy", "columns": list(df.columns), "rows": len(df)}
+        if parquet:
+            df.to_parquet(os.path.join(folder, key + ".parquet"), index=False)
+            meta["arrays"][key]["parquet"] = key + ".parquet"
+    # meta.json na końcu - jego obecność oznacza kompletny zapis
+    with open(os.path.join(folder, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump(meta, file, ensure_ascii=False, indent=2)
+
+def export_arrays(result, arrays_folder, parquet=False):
+    if result["data"] is None:
+        return
+    # Pełna nazwa pliku (a.txt i a.csv to osobne foldery), folder zapisywany od nowa - bez plików
+    # z poprzedniego zapisu (np. .parquet zapisanego wcześniej z pyarrow)
+    folder = os.path.join(arrays_folder, result["filename"])
+    try:
+        shutil.rmtree(folder, ignore_errors=True)
+        save_arrays(folder, result, parquet)
+    except Exception as e:
+        print(f"\033[91mBłąd podczas zapisywania danych {result['filename']} do {arrays_folder}: {e} \033[0m")
+
+# Odczyt wyników zapisanych przez export_arrays: {'meta', 'processed', 'raw'}, dane jako {kolumna: np.ndarray}
+# mapowane do pamięci (mmap_mode='r', bez wczytywania pliku) lub wczytane (mmap_mode=None)
+def load_arrays(folder, mmap_mode='r'):
+    with open(os.path.join(folder, "meta.json"), encoding="utf-8") as file:
+        meta = json.load(file)
+    arrays = {"meta": meta}
+    for key, info in meta["arrays"].items():
+        values = np.load(os.path.join(folder, info["npy"]), mmap_mode=mmap_mode)
+        arrays[key] = {column: values[:, position] for position, column in enumerate(info["columns"])}
+    return arrays
+
+# Format nagłówków kolumn danych, jak w pandas.DataFrame.to_excel
+XLSX_HEADER_FORMAT = {'bold': True, 'align': 'center', 'valign': 'top', 'top': 1, 'right': 1, 'bottom': 1, 'left': 1}
+
+# Zapis DataFrame do arkusza kolumnami (nagłówek w startrow, dane od startrow + 1), NaN jako pusta komórka
+def write_dataframe_columns(worksheet, df, startrow, startcol, header_format):
+    for col, column in enumerate(df.columns):
+        worksheet.write_string(startrow, startcol + col, column, header_format)
+    for col, column in enumerate(df.columns):
+        values = df[column].to_numpy(dtype=np.float64)
+        worksheet.write_column(startrow + 1, startcol + col, np.where(np.isnan(values), None, values).tolist())
+
+# Wiersze DataFrame jako krotki (NaN jako None - pusta komórka), konwersja porcjami bez kopii całych danych
+def dataframe_rows(df, chunk_rows=65536):
+    arrays = [df[column].to_numpy(dtype=np.float64) for column in df.columns]
+    for start in range(0, len(df), chunk_rows):
+        columns = [np.where(np.isnan(values[start:start + chunk_rows]), None, values[start:start + chunk_rows]).tolist() for values in arrays]
+        yield from zip(*columns)
+
+# Zapis komórki arkusza: od razu, a w trybie strumieniowym (constant_memory) do bufora zapisywanego wierszami
+def sheet_write(target, row, col, value, cell_format=None):
+    if target["pending"] is None:
+        target["worksheet"].write(row, col, value, cell_format)
+    else:
+        target["pending"]["cells"].append((row, col, value, cell_format))
+
+# Zapis DataFrame (nagłówek w startrow, dane od startrow + 1) - od razu kolumnami albo do bufora trybu strumieniowego
+def sheet_write_dataframe(target, df, startrow, startcol):
+    if target["pending"] is None:
+        write_dataframe_columns(target["worksheet"], df, startrow, startcol, target["header_format"])
+    else:
+        for col, column in enumerate(df.columns):
+            sheet_write(target, startrow, startcol + col, column, target["header_format"])
+        target["pending"]["blocks"].append((startrow + 1, startcol, df))
+
+# Tryb strumieniowy: zapis bufora w kolejności wierszy (xlsxwriter constant_memory zapisuje wiersz na dysk
+# po przejściu do następnego), układ kolumn obok siebie bez zmian - wiersz po wierszu przez wszystkie pliki
+def flush_streamed_sheet(target):
+    worksheet = target["worksheet"]
+    pending = target["pending"]
+    # Nazwy, serie i nagłówki (wiersze przed danymi), kolejność zapisu zachowana dla tej samej komórki
+    for row, col, value, cell_format in sorted(pending["cells"], key=lambda cell: (cell[0], cell[1])):
+        worksheet.write(row, col, value, cell_format)
+    # Dane: bloki od najdłuższego, krótsze kończą się wcześniej
+    blocks = sorted(((startrow, startcol, len(df), dataframe_rows(df)) for startrow, startcol, df in pending["blocks"]),
+                    key=lambda block: block[2], reverse=True)
+    active = len(blocks)
+    offset = 0
+    while active > 0:
+        while active > 0 and blocks[active - 1][2] <= offset:
+            active -= 1
+        for startrow, startcol, length, rows in blocks[:active]:
+            worksheet.write_row(startrow + offset, startcol, next(rows))
+        offset += 1
+    target["pending"] = None
+
+# Seria wykresu punktowego z linią ciągłą: nazwa z komórki w wierszu 1, dane od wiersza 3
+# (albo z innego arkusza data_sheet od wiersza first_row - seria zdecymowana)
+def chart_series(sheet_name, name_col, x_col, y_col, length, data_sheet=None, first_row=3):
+    data_sheet = data_sheet or sheet_name
+    return {
+        'name': [sheet_name, 1, name_col],
+        'categories': [data_sheet, first_row, x_col, first_row + length - 1, x_col],  # Zakres dla osi X
+        'values': [data_sheet, first_row, y_col, first_row + length - 1, y_col],  # Zakres dla osi Y
+        'line': {'width': 2},  # Ciągła linia bez punktów
+        'marker': {'type': 'none'},  # Wyłącza wyświetlanie punktów
+    }
+
+# Decymacja serii do wykresu algorytmem Largest-Triangle-Three-Buckets (LTTB)
+def lttb_indices(x, y, threshold):
+    """
+    Wybiera threshold punktów serii (x, y) zachowujących jej kształt: pierwszy i ostatni punkt oraz
+    z każdego kubełka punkt tworzący największy trójkąt z poprzednio wybranym punktem i średnią
+    następnego kubełka. Punkty z NaN są pomijane.
+
+    Args:
+        x (np.ndarray): Wartości osi X.
+        y (np.ndarray): Wartości osi Y.
+        threshold (int): Liczba punktów po decymacji.
+
+    Returns:
+        np.ndarray: Rosnące indeksy wybranych punktów.
+    """
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    n = len(valid)
+    if threshold >= n or threshold < 3:
+        return valid
+    x, y = x[valid], y[valid]
+    # Granice kubełków (pierwszy i ostatni punkt osobno) oraz średnie kubełków
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Średnia następnego kubełka (dla ostatniego - ostatni punkt)
+        if bucket + 1 < threshold - 2:
+            next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(area.argmax())
+        selected[bucket + 1] = a
+    return valid[selected]
+
+# Arkusz pomocniczy (ukryty) z danymi do wykresów - zdecymowane serie RAW, tworzony przy pierwszym użyciu
+CHART_DATA_SHEET = "chart_data"
+
+def chart_data_target(target):
+    if target["chart_data"] is None:
+        worksheet = target["book"].add_worksheet(CHART_DATA_SHEET)
+        worksheet.hide()
+        target["chart_data"] = {"worksheet": worksheet, "header_format": target["header_format"], "col_offset": 0,
+                                "pending": {"cells": [], "blocks": []} if target["pending"] is not None else None}
+    return target["chart_data"]
+
+# Zakres danych serii do wykresu (x_col, y_col, length, data_sheet, first_row): pełne dane z arkusza albo,
+# gdy chart_points > 0 i danych jest więcej, seria zdecymowana (LTTB) zapisana w arkuszu chart_data
+def series_range(target, df, column, x_col, y_col, chart_points=0):
+    if chart_points <= 0 or len(df) <= chart_points:
+        return x_col, y_col, len(df), None, 3
+    x = df['Distance [m]'].to_numpy(dtype=np.float64)
+    y = df[column].to_numpy(dtype=np.float64)
+    indices = lttb_indices(x, y, chart_points)
+    chart_data = chart_data_target(target)
+    start_col = chart_data["col_offset"]
+    sheet_write_dataframe(chart_data, pd.DataFrame({'Distance [m]': x[indices], column: y[indices]}), 0, start_col)
+    chart_data["col_offset"] += 3 # dwie kolumny i separator
+    return start_col, start_col + 1, len(indices), CHART_DATA_SHEET, 1
+
+# Nazwa pliku bez nawiasów (tytuł) i nazwa serii - tekst w nawiasie nazwy pliku, a jak go nie ma to nazwa pliku
+def series_names(filename):
+    match = re.search(r'\((.*?)\)', filename)  # szukaj nawiasu i danych w nim
+    text_in_brackets = match.group(1) if match else ""  # jak jest nawias to przypisz dane
+    cleaned_filename = filename.replace('.csv', "").replace('(', "").replace(')', "")  # usuń nawias z nazwy
+    return cleaned_filename, (text_in_brackets if match else filename)
+
+# Oś X wykresów: od 0 do maksymalnej drogi zaokrąglonej w górę do 25 m, z pionowymi liniami siatki
+def chart_x_axis(df, x_axis_label):
+    x_axis_max = max(1, int(round(df['Distance [m]'].max())))
+    x_axis_max = (int((x_axis_max + 24) / 25)) * 25
+    return {
+        'name': x_axis_label,  # nazwa osi X zależna od języka
+        'min': 0,  # minimalna wartość osi X
+        'max': x_axis_max,  # zakres
+        'major_unit': max(25, int(round(x_axis_max / 5.0))),  # podziałka
+        'major_gridlines': {'visible': True},  # dodaj pionowe kreski
+    }
+
+# Funkcja generująca wykresy z danych - jedno przejście po wynikach zapisuje trzy pliki .xlsx:
+# obrobione dane (output_xlsx), obrobione i RAW obok siebie (output_xlsx_all) oraz RAW (output_xlsx_raw)
+def generate_combined_workbooks(results, results_raw, series_from_filename, chart_lang, stream_raw=0, chart_points=0,
+                                output_xlsx="combined_data.xlsx", output_xlsx_all="combined_data_all.xlsx", output_xlsx_raw="combined_data_raw.xlsx"):
+    """
+    Args:
+        results (list): Lista (nazwa pliku wynikowego, DataFrame) obrobionych danych, w kolejności plików.
+        results_raw (list): Lista (nazwa pliku wynikowego, DataFrame) danych RAW, w tej samej kolejności.
+        series_from_filename (int): 1 - nazwa serii z tekstu w nawiasie nazwy pliku.
+        chart_lang (str): Język nazw osi ('pl' lub 'en').
+        stream_raw (int): 1 - pliki z danymi RAW (output_xlsx_all, output_xlsx_raw) zapisywane strumieniowo
+            (xlsxwriter constant_memory), pamięć zapisu niezależna od liczby wierszy.
+        chart_points (int): Maksymalna liczba punktów serii RAW na wykresie (decymacja LTTB, pełne dane
+            zostają w arkuszu), 0 - wszystkie punkty.
+    """
+    import xlsxwriter # Import przy pierwszym użyciu
+    # Ustawienie nazw osi w zależności od języka
+    if chart_lang == 'pl':
+        x_axis_label = 'Droga [m]'
+        y_axis_label_mu = 'Współczynnik tarcia'
+        y_axis_label_pd = 'Zużycie liniowe [µm]'
+    else:  # Domyślnie angielski
+        x_axis_label = 'Distance [m]'
+        y_axis_label_mu = 'Friction coefficient'
+        y_axis_label_pd = 'Linear wear [µm]'
+
+    workbooks = {}
+    try:
+        for output in (output_xlsx, output_xlsx_all, output_xlsx_raw):
+            streamed = stream_raw == 1 and output != output_xlsx
+            workbook = xlsxwriter.Workbook(output, {'constant_memory': streamed})
+            sheet_name = os.path.basename(output).replace('.xlsx', "")[:31]  # Nazwa arkusza danych (limit do 31 znaków)
+            workbooks[output] = {"book": workbook, "sheet_name": sheet_name, "worksheet": workbook.add_worksheet(sheet_name),
+                                 "header_format": workbook.add_format(XLSX_HEADER_FORMAT), "col_offset": 0,
+                                 "pending": {"cells": [], "blocks": []} if streamed else None, "chart_data": None}
+
         row_offset = 0  # Przesunięcie wiersza na wykresy
-        sheet_name = output_xlsx.replace('.xlsx', "")[:31]  # Nazwa arkusza danych (limit do 31 znaków)
-
-        # Ustawienie nazw osi w zależności od języka
-        if chart_lang == 'pl':
-            x_axis_label = 'Droga [m]'
-            y_axis_label_mu = 'Współczynnik tarcia'
-            y_axis_label_pd = 'Zużycie liniowe [µm]'
-        else:  # Domyślnie angielski
-            x_axis_label = 'Distance [m]'
-            y_axis_label_mu = 'Friction coefficient'
-            y_axis_label_pd = 'Linear wear [µm]'
-
-        for csv_file, csv_file_raw in zip(csv_files, csv_files_raw):
-            # Wczytaj dane z głównego pliku CSV
-            df = pd.read_csv(csv_file)
-            # Wczytaj dane z pliku surowego CSV
-            df_raw = pd.read_csv(csv_file_raw)
-
-            # Zapisz dane z obu DataFrame do arkusza, z uwzględnieniem przesunięcia kolumn
-            df.to_excel(writer, sheet_name=sheet_name, index=False, startrow=2, startcol=col_offset)
-            df_raw.to_excel(writer, sheet_name=sheet_name, index=False, startrow=2, startcol=col_offset + len(df.columns) + 1)
-
-            # Uzyskaj nazwę pliku i tekst w nawiasach
-            filename = os.path.basename(csv_file)
-            match = re.search(r'\((.*?)\)', filename)
-            text_in_brackets = match.group(1) if match else ""
-            cleaned_filename = filename.replace('.csv', "").replace('(', "").replace(')', "")
-
-            # Obiekt worksheet
-            worksheet = writer.sheets[sheet_name]
-            # Informacje na początku pliku .xlsx
-            worksheet.write(0, col_offset, cleaned_filename)
-
-            series_name = text_in_brackets if match else filename
+        for (filename, df), (filename_raw, df_raw) in zip(results, results_raw):
+            # Definicje wykresów wspólne dla wszystkich plików .xlsx (tytuły z nazwy pliku bez nawiasów)
+            charts = {}
+            for name, data in ((filename, df), (filename_raw, df_raw)):
+                cleaned_filename, series_name = series_names(name)
+                charts[name] = {"cleaned_filename": cleaned_filename, "series_name": series_name,
+                                "title_mu": {'name': f"{cleaned_filename} - µ"},
+                                "title_pd": {'name': f"{cleaned_filename} - Penetration Depth [µm]"},
+                                "x_axis": chart_x_axis(data, x_axis_label)}
+            y_axis_mu = {'name': y_axis_label_mu}  # nazwa osi Y zależna od języka
+            y_axis_pd = {'name': y_axis_label_pd}
+
+            # Pliki z jednym zestawem danych: obrobione albo RAW
+            for output, name, data, points in ((output_xlsx, filename, df, 0), (output_xlsx_raw, filename_raw, df_raw, chart_points)):
+                target = workbooks[output]
+                cleaned_filename, series_name = charts[name]["cleaned_filename"], charts[name]["series_name"]
+                worksheet, sheet_name, col_offset = target["worksheet"], target["sheet_name"], target["col_offset"]
+                sheet_write_dataframe(target, data, 2, col_offset)
+                # Info na początku pliku .xlsx - nazwa bez nawiasów w pierwszej kolumnie
+                sheet_write(target, 0, col_offset, cleaned_filename)
+                # Jeśli chcesz nazwę serii z nazwy pliku w nawiasie, to ją przypisz do serii
+                if series_from_filename == 1:
+                    sheet_write(target, 1, col_offset + 2, series_name) # nazwa z zawartością nawiasów w trzeciej kolumnie
+                    sheet_write(target, 1, col_offset + 1, series_name)
+                # Dodaj wykres µ
+                if series_from_filename == 0: sheet_write(target, 1, col_offset + 1, 'µ')
+                chart = target["book"].add_chart({'type': 'scatter'})
+                chart.add_series(chart_series(sheet_name, col_offset + 1, *series_range(target, data, 'µ', col_offset, col_offset + 1, points)))
+                chart.set_title(charts[name]["title_mu"])
+                chart.set_x_axis(charts[name]["x_axis"])
+                chart.set_y_axis(y_axis_mu)
+                worksheet.insert_chart(f"B{25 + row_offset}", chart)
+                # Dodaj wykres Penetration Depth [µm] (jeśli istnieje)
+                if 'Penetration Depth [µm]' in data.columns:
+                    if series_from_filename == 0: sheet_write(target, 1, col_offset + 2, 'P.D. [µm]')
+                    chart_pd = target["book"].add_chart({'type': 'scatter'})
+                    chart_pd.add_series(chart_series(sheet_name, col_offset + 2, *series_range(target, data, 'Penetration Depth [µm]', col_offset, col_offset + 2, points)))
+                    chart_pd.set_title(charts[name]["title_pd"])
+                    chart_pd.set_x_axis(charts[name]["x_axis"])
+                    chart_pd.set_y_axis(y_axis_pd)
+                    worksheet.insert_chart(f"J{25 + row_offset}", chart_pd)
+                # Dodaj pustą kolumnę jako separator
+                target["col_offset"] += len(data.columns) + 1
+
+            # Plik z danymi obrobionymi i RAW obok siebie, na wspólnych wykresach
+            target = workbooks[output_xlsx_all]
+            worksheet, sheet_name, col_offset = target["worksheet"], target["sheet_name"], target["col_offset"]
+            raw_offset = col_offset + len(df.columns) + 1
+            cleaned_filename, series_name = charts[filename]["cleaned_filename"], charts[filename]["series_name"]
+            sheet_write_dataframe(target, df, 2, col_offset)
+            sheet_write_dataframe(target, df_raw, 2, raw_offset)
+            sheet_write(target, 0, col_offset, cleaned_filename)
             if series_from_filename == 1:
-                if csv_files_raw: # jeżeli jest csv_files_raw
-                    worksheet.write(1, col_offset + len(df.columns) + 2, series_name + " RAW")
-                    worksheet.write(1, col_offset + len(df.columns) + 3, series_name + " RAW")
-                if csv_files: # jeżeli jest csv_files
-                    worksheet.write(1, col_offset + 1, series_name)
-                    worksheet.write(1, col_offset + 2, series_name)
-
-            # Maksymalna wartość dla osi X
-            x_axis_max = max(1, int(round(df['Distance [m]'].max())))
-            x_axis_max = (int((x_axis_max + 24) / 25)) * 25
-
-            # Dodaj wykres µ
-            chart = writer.book.add_chart({'type': 'scatter'})
-            # Dodaj serię z danych surowych na tym samym wykresie RAW
-            if series_from_filename == 0: worksheet.write(1, col_offset + len(df.columns) + 2, 'µ RAW')
-            chart.add_series({
-                'name': [sheet_name, 1, col_offset + len(df.columns) + 2],
-                'categories': [sheet_name, 3, col_offset + len(df.columns) + 1, 3 + len(df_raw) - 1, col_offset + len(df.columns) + 1],
-                'values': [sheet_name, 3, col_offset + len(df.columns) + 2, 3 + len(df_raw) - 1, col_offset + len(df.columns) + 2],
-                'line': {'width': 2},
-                'marker': {'type': 'none'},
-            })
-            # Dodaj serię z danych przefiltrowanych na tym samym wykresie MAIN
-            if series_from_filename == 0: worksheet.write(1, col_offset + 1, 'µ')
-            chart.add_series({
-                'name': [sheet_name, 1, col_offset + 1],
-                'categories': [sheet_name, 3, col_offset, 3 + len(df) - 1, col_offset],
-                'values': [sheet_name, 3, col_offset + 1, 3 + len(df) - 1, col_offset + 1],
-                'line': {'width': 2},
-                'marker': {'type': 'none'},
-            })
-            chart.set_title({'name': f"{cleaned_filename} - µ"})
-            chart.set_x_axis({
-                'name': x_axis_label,
-                'min': 0,
-                'max': max(25, x_axis_max),
-                'major_unit': max(25, int(round(x_axis_max / 5.0))) if x_axis_max >= 10 else 2,
-                'major_gridlines': {'visible': True},
-            })
-            chart.set_y_axis({
-                'name': y_axis_label_mu,
-            })
+                sheet_write(target, 1, raw_offset + 1, series_name + " RAW")
+                sheet_write(target, 1, raw_offset + 2, series_name + " RAW")
+                sheet_write(target, 1, col_offset + 1, series_name)
+                sheet_write(target, 1, col_offset + 2, series_name)
+            # Dodaj wykres µ - seria RAW i seria obrobiona na tym samym wykresie
+            chart = target["book"].add_chart({'type': 'scatter'})
+            if series_from_filename == 0: sheet_write(target, 1, raw_offset + 1, 'µ RAW')
+            chart.add_series(chart_series(sheet_name, raw_offset + 1, *series_range(target, df_raw, 'µ', raw_offset, raw_offset + 1, chart_points)))
+            if series_from_filename == 0: sheet_write(target, 1, col_offset + 1, 'µ')
+            chart.add_series(chart_series(sheet_name, col_offset + 1, col_offset, col_offset + 1, len(df)))
+            chart.set_title(charts[filename]["title_mu"])
+            chart.set_x_axis(charts[filename]["x_axis"])
+            chart.set_y_axis(y_axis_mu)
             worksheet.insert_chart(f"B{25 + row_offset}", chart)
-
             # Dodaj wykres Penetration Depth [µm] (jeśli istnieje)
             if 'Penetration Depth [µm]' in df.columns:
-                chart_pd = writer.book.add_chart({'type': 'scatter'})
-                # Dodaj serię z danych surowych na tym samym wykresie RAW
-                if series_from_filename == 0: worksheet.write(1, col_offset + len(df.columns) + 3, 'P.D. RAW [µm]')
-                chart_pd.add_series({
-                    'name': [sheet_name, 1, col_offset + len(df.columns) + 3],
-                    'categories': [sheet_name, 3, col_offset + len(df.columns) + 1, 3 + len(df_raw) - 1, col_offset + len(df.columns) + 1],
-                    'values': [sheet_name, 3, col_offset + len(df.columns) + 3, 3 + len(df_raw) - 1, col_offset + len(df.columns) + 3],
-                    'line': {'width': 2},
-                    'marker': {'type': 'none'},
-                })
-                # Dodaj serię z danych przefiltrowanych na tym samym wykresie MAIN
-                if series_from_filename == 0: worksheet.write(1, col_offset + 2, 'P.D. [µm]')
-                chart_pd.add_series({
-                    'name': [sheet_name, 1, col_offset + 2],
-                    'categories': [sheet_name, 3, col_offset, 3 + len(df) - 1, col_offset],
-                    'values': [sheet_name, 3, col_offset + 2, 3 + len(df) - 1, col_offset + 2],
-                    'line': {'width': 2},
-                    'marker': {'type': 'none'},
-                })
-                chart_pd.set_title({'name': f"{cleaned_filename} - Penetration Depth [µm]"})
-                chart_pd.set_x_axis({
-                    'name': x_axis_label,
-                    'min': 0,
-                    'max': 100 if x_axis_max < 10 else x_axis_max,
-                    'major_unit': max(25, int(round(x_axis_max / 5.0))) if x_axis_max >= 10 else 2,
-                    'major_gridlines': {'visible': True},
-                })
-                chart_pd.set_y_axis({
-                    'name': y_axis_label_pd,
-                })
+                chart_pd = target["book"].add_chart({'type': 'scatter'})
+                if series_from_filename == 0: sheet_write(target, 1, raw_offset + 2, 'P.D. RAW [µm]')
+                chart_pd.add_series(chart_series(sheet_name, raw_offset + 2, *series_range(target, df_raw, 'Penetration Depth [µm]', raw_offset, raw_offset + 2, chart_points)))
+                if series_from_filename == 0: sheet_write(target, 1, col_offset + 2, 'P.D. [µm]')
+                chart_pd.add_series(chart_series(sheet_name, col_offset + 2, col_offset, col_offset + 2, len(df)))
+                chart_pd.set_title(charts[filename]["title_pd"])
+                chart_pd.set_x_axis(charts[filename]["x_axis"])
+                chart_pd.set_y_axis(y_axis_pd)
                 worksheet.insert_chart(f"J{25 + row_offset}", chart_pd)
+            target["col_offset"] += len(df.columns) + len(df_raw.columns) + 2
 
-            col_offset += len(df.columns) + len(df_raw.columns) + 2
+            # Aktualizuj offset wiersza
             row_offset += 15
-    print(f"Dane zostały zapisane do pliku {output_xlsx}")
 
-def main():
+        # Tryb strumieniowy - zapis buforowanych danych w kolejności wierszy
+        for target in workbooks.values():
+            if target["pending"] is not None:
+                flush_streamed_sheet(target)
+            if target["chart_data"] is not None and target["chart_data"]["pending"] is not None:
+                flush_streamed_sheet(target["chart_data"])
+    finally:
+        for output, target in workbooks.items():
+            target["book"].close()
+    for output in (output_xlsx, output_xlsx_all, output_xlsx_raw):
+        print(f"Dane zostały zapisane do pliku {output}")
+
+# Zapis plików xlsx z wyników obróbki (wyniki process_file w kolejności plików, także nieprzetworzone)
+def write_workbooks(file_results, title_from_text, chart_lang, stream_raw_xlsx=0, chart_points=0, output_dir="."):
+    results = [(result["output_file"], result["data"]) for result in file_results if result["data"] is not None]
+    results_raw = [(result["output_file_raw"], result["data_raw"]) for result in file_results if result["data"] is not None]
+    if not results:
+        return 0
+    print("Generowanie pliku Excelowskiego ...")
+    try:
+        generate_combined_workbooks(results, results_raw, title_from_text, chart_lang, stream_raw_xlsx, chart_points,
+                                    output_path(output_dir, "combined_data.xlsx"), output_path(output_dir, "combined_data_all.xlsx"),
+                                    output_path(output_dir, "combined_data_raw.xlsx"))
+        return 1
+    except Exception as e:
+        print(f"\033[91mBłąd podczas zapisywania plików xlsx: {e} \033[0m")
+        return 0
+
+# Pliki z danymi (.txt i .csv) w folderze, w kolejności os.listdir
+def list_input_files(folder_path):
+    return [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(".txt") or f.endswith(".csv")]
+
+# Stan pliku do wykrywania zmian: (rozmiar, czas modyfikacji) lub None gdy pliku nie ma
+def file_signature(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+# Obserwowanie folderu (tryb ciągły): obróbka tylko nowych lub zmienionych plików i odświeżenie plików xlsx
+def watch_folder(folder_path, file_results, snapshots, interval, settings, workers=0, csv_folder=None, cache=None, workbook_options=None, arrays_folder=None, progress=None):
+    """
+    Sprawdza folder co interval sekund. Plik nowy lub zmieniony jest przetwarzany, gdy jego rozmiar i czas
+    modyfikacji nie zmieniły się przez jeden odstęp (zapis zakończony) i da się go otworzyć. Pliki xlsx są
+    generowane ponownie z wyników trzymanych w pamięci, bez ponownej obróbki pozostałych plików.
+    Działa do przerwania (Ctrl+C).
+
+    Args:
+        folder_path (str): Obserwowany folder.
+        file_results (dict): Wyniki process_file według ścieżki pliku (uzupełniane na bieżąco).
+        snapshots (dict): Stan plików (file_signature) z chwili ich obróbki, według ścieżki pliku.
+        interval (float): Odstęp sprawdzania folderu w sekundach.
+        settings, workers, csv_folder, cache, progress: Jak w process_files.
+        workbook_options (dict): Argumenty write_workbooks poza wynikami.
+        arrays_folder (str): Folder zapisu wyników export_arrays lub None.
+    """
+    workbook_options = workbook_options or {}
+    candidates = {} # Pliki nowe lub zmienione, oczekujące na zakończenie zapisu
+    print(f"\nObserwowanie folderu {os.path.abspath(folder_path)} co {interval:g} s, Ctrl+C kończy ...")
+    try:
+        while True:
+            time.sleep(interval)
+            current = {}
+            for file_path in list_input_files(folder_path):
+                signature = file_signature(file_path)
+                if signature is not None:
+                    current[file_path] = signature
+            changed = False
+            for file_path in list(file_results):
+                if file_path not in current:
+                    print(f"\nUsunięto plik: {os.path.basename(file_path)}")
+                    del file_results[file_path]
+                    snapshots.pop(file_path, None)
+                    changed = True
+            ready = []
+            for file_path, signature in current.items():
+                if snapshots.get(file_path) == signature:
+                    candidates.pop(file_path, None)
+                elif candidates.get(file_path) == signature and os.access(file_path, os.R_OK):
+                    ready.append(file_path)
+                else:
+                    candidates[file_path] = signature
+            if ready:
+                for file_path, result in zip(ready, process_files(ready, settings, workers, csv_folder, cache, progress=progress)):
+                    file_results[file_path] = result
+                    snapshots[file_path] = candidates.pop(file_path)
+                    if result["data"] is None:
+                        print(f"\033[91m Plik: {result['filename']} NIE ZOSTAŁ POPRAWNIE PRZETWORZONY\033[0m")
+                    elif arrays_folder is not None:
+                        export_arrays(result, arrays_folder, parquet_available())
+                changed = True
+            if changed:
+                ordered = [file_results[file_path] for file_path in current if file_path in file_results]
+                if write_workbooks(ordered, **workbook_options) == 1:
+                    print(f"\033[92mZaktualizowano pliki xlsx ({time.strftime('%H:%M:%S')}) \033[0m")
+    except KeyboardInterrupt:
+        print("\nZakończono obserwowanie folderu.")
+
+# Ścieżka pliku wynikowego w folderze wyjściowym (domyślnie folder bieżący)
+def output_path(output_dir, name):
+    return name if output_dir in (None, ".") else os.path.join(output_dir, name)
+
+# Pliki wejściowe z argumentów: pliki, foldery (pliki .txt i .csv) lub wzorce (np. dane/*.csv)
+# Zwraca (pliki, argumenty bez plików ani folderów) - nieznalezione liczone są jako pliki nieprzetworzone
+def resolve_input_paths(paths):
+    file_paths = []
+    missing_paths = []
+    for path in paths:
+        matches = sorted(glob.glob(path)) if glob.has_magic(path) else [path]
+        if not matches or not all(os.path.exists(match) for match in matches):
+            print(f"\033[91m Nie znaleziono: {path} \033[0m")
+            missing_paths.append(path)
+            continue
+        for match in matches:
+            candidates = list_input_files(match) if os.path.isdir(match) else [match]
+            file_paths.extend(candidate for candidate in candidates if candidate not in file_paths)
+    return file_paths, missing_paths
+
+# Argumenty wiersza poleceń (tryb wsadowy, bez pytań i odliczania)
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(
+        description="Program do obróbki danych z tribometru: TRB3, Nano TRB, T11, Rtec. "
+                    "Bez argumentów działa interaktywnie w folderze bieżącym.")
+    parser.add_argument("paths", nargs="*", default=["."], help="pliki, foldery lub wzorce plików z danymi (domyślnie folder bieżący)")
+    parser.add_argument("-o", "--output-dir", default=".", help="folder na pliki xlsx, _temp i _cache (domyślnie folder bieżący)")
+    parser.add_argument("-c", "--config", help="plik konfiguracyjny (domyślnie config.ini lub _config.ini, bez pliku - wartości domyślne)")
+    parser.add_argument("-j", "--jobs", type=int, help="liczba procesów, 0 - wszystkie rdzenie (nadpisuje workers)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="bez komunikatów, wynik tylko w kodzie wyjścia")
+    parser.add_argument("--json", action="store_true", help="podsumowanie JSON na stdout, komunikaty na stderr")
+    parser.add_argument("--watch", action="store_true", help="obserwowanie folderu (nadpisuje watch)")
+    parser.add_argument("--export-arrays", action="store_true", help="zapis wyników do _arrays (.npy, .parquet) (nadpisuje export_arrays)")
+    parser.add_argument("--profile", action="store_const", const=1, help="pomiar czasu etapów obróbki, zapis profile_trace.json (nadpisuje profile)")
+    parser.add_argument("--profile-memory", action="store_const", const=2, dest="profile", help="jak --profile, także szczyt pamięci etapów (tracemalloc, wolniej)")
+    parser.add_argument("--no-progress", action="store_true", help="bez paska postępu obróbki (nadpisuje progress)")
+    parser.add_argument("--no-cache", action="store_true", help="pominięcie pamięci podręcznej wyników")
+    parser.add_argument("--clear-cache", action="store_true", help="wyczyszczenie pamięci podręcznej wyników przed obróbką")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    args = parser.parse_args(argv)
+    if args.config is not None and not os.path.isfile(args.config):
+        parser.error(f"nie znaleziono pliku konfiguracyjnego: {args.config}")
+    if args.watch and (len(args.paths) != 1 or not os.path.isdir(args.paths[0])):
+        parser.error("--watch wymaga jednego folderu")
+    return args
+
+def main(argv=None):
+    """
+    Uruchamia program. Bez argumentów - tryb interaktywny (pytania gdy brak configu, odliczanie do zamknięcia
+    konsoli), z argumentami - tryb wsadowy bez pytań i odliczania.
+
+    Returns:
+        int: Kod wyjścia - liczba plików, które nie zostały przetworzone (wszystkie, gdy nie zapisano plików xlsx),
+        powiększona o liczbę nieznalezionych ścieżek lub wzorców z argumentów.
+    """
     # Disable generation .pyc files
     sys.dont_write_bytecode = True
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_arguments(argv)
+    stdout = sys.stdout
+    with contextlib.ExitStack() as stack:
+        if args.quiet:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w", encoding="utf-8"))))
+        elif args.json:
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        summary = run(args, headless=len(argv) > 0)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2), file=stdout)
+    return min(summary["failed"], 255)
+
+# Obróbka plików i zapis plików xlsx według argumentów, zwraca podsumowanie
+def run(args, headless):
     # Enable ANSI escape codes in terminal
-    kernel32 = ctypes.windll.kernel32
-    kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
+    if os.name == "nt":
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
     print("Program do obróbki danych z tribometru: TRB3, Nano TRB, T11, Rtec")
     print("Wczytuje pliki .txt i .csv z folderu z programem")
     print("Pliki te powinny mieć w nazwie nawias () a w nim nazwę serii")
     print("Pliki z Rtec powinny mieć w nazwie prędkość liniową np. 0.1m-s a dla T11 dodatkowo obciążenie np. 10N\n")
-    folder_path = '.'
+    output_dir = args.output_dir
 
-    # Przygotuj folder tymczasowy na pliki do usunięcia
-    temp_folder_base = "_temp"
-    temp_folder = temp_folder_base
+    config_path = args.config or "config.ini"
+    if not os.path.isfile(config_path):
+        config_path = "_config.ini"
+    if os.path.isfile(config_path) or headless:
+        config = load_config(config_path) # Wczytaj dane z configu (tryb wsadowy bez pliku - wartości domyślne)
+        offset_raw = config['offset_raw']
+        title_from_text = config['title_from_text']
+        erase_peak = config['erase_peak']
+        invert_peak = config['invert_peak']
+        default_window_length_u = config['default_window_length_u']
+        default_window_length_pd = config['default_window_length_pd']
+        min_sample = config['min_sample']
+        max_sample = config['max_sample']
+        chart_lang = config['chart_lang']
+        workers = config['workers']
+        keep_csv = config['keep_csv']
+        stream_raw_xlsx = config['stream_raw_xlsx']
+        chart_points = config['chart_points']
+        cache_mode = config['cache']
+        cache_size_mb = config['cache_size_mb']
+        watch = config['watch']
+        watch_interval = config['watch_interval']
+        export_arrays_mode = config['export_arrays']
+        profile = config['profile']
+        progress_mode = config['progress']
+    else:
+        min_sample, max_sample, default_window_length_u, default_window_length_pd, title_from_text, offset_raw, erase_peak, invert_peak, chart_lang = ask_user_for_variables() # Wczytaj dane od użytkownika
+        workers = 0
+        keep_csv = 0
+        stream_raw_xlsx = 0
+        chart_points = 0
+        cache_mode = 0
+        cache_size_mb = 1024
+        watch = 0
+        watch_interval = 2
+        export_arrays_mode = 0
+        profile = 0
+        progress_mode = 1
+    # Argumenty wiersza poleceń nadpisują config
+    if args.jobs is not None:
+        workers = args.jobs
+    if args.no_cache:
+        cache_mode = 0
+    elif args.clear_cache:
+        cache_mode = 2
+    if args.watch:
+        watch = 1
+    if args.export_arrays:
+        export_arrays_mode = 1
+    if args.profile is not None:
+        profile = args.profile
+    if args.no_progress:
+        progress_mode = 0
+    if output_dir != ".":
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Przygotuj folder na pliki CSV każdego pliku, tylko gdy mają być zachowane (keep_csv = 1)
+    temp_folder_base = output_path(output_dir, "_temp")
+    temp_folder = temp_folder_base if keep_csv == 1 else None
     counter = 1
-    while True:
+    while temp_folder is not None:
         if not os.path.exists(temp_folder):
             try:
                 os.makedirs(temp_folder)
-                print(f"Stworzono folder tymczasowy: {temp_folder}")
+                print(f"Stworzono folder na pliki CSV: {temp_folder}")
                 break
             except Exception as e:
                 print(f"\033[91mNie udało się utworzyć folderu {temp_folder}: {e}\033[0m")
@@ -1299,139 +2544,123 @@ def main():
         else:
             # Folder istnieje, sprawdź czy jest pusty
             if not os.listdir(temp_folder):
-                print(f"Użycie istniejącego pustego folderu tymczasowego: {temp_folder}")
+                print(f"Użycie istniejącego pustego folderu na pliki CSV: {temp_folder}")
                 break
             else:
                 temp_folder = f"{temp_folder_base}_{counter}"
                 counter += 1
 
-    csv_files = []
-    csv_files_raw = []
-    config_path = "config.ini"
-    if not os.path.isfile(config_path):
-        config_path = "_config.ini"
-    if os.path.isfile(config_path):
-        config = load_config(config_path) # Wczytaj dane z configu
-        offset_raw = config['offset_raw']
-        title_from_text = config['title_from_text']
-        erase_peak = config['erase_peak']
-        invert_peak = config['invert_peak']
-        default_window_length_u = config['default_window_length_u']
-        default_window_length_pd = config['default_window_length_pd']
-        min_sample = config['min_sample']
-        max_sample = config['max_sample']
-        chart_lang = config['chart_lang']
-    else:
-        min_sample, max_sample, default_window_length_u, default_window_length_pd, title_from_text, offset_raw, erase_peak, invert_peak, chart_lang = ask_user_for_variables() # Wczytaj dane od użytkownika
+    # Pamięć podręczna wyników (cache = 1), cache = 2 - wyczyszczenie i utworzenie od nowa
+    cache = None
+    cache_folder = output_path(output_dir, CACHE_FOLDER)
+    if cache_mode == 2:
+        cache_clear(cache_folder)
+        print(f"Wyczyszczono pamięć podręczną wyników: {cache_folder}")
+    if cache_mode > 0:
+        try:
+            os.makedirs(cache_folder, exist_ok=True)
+            cache = {"folder": cache_folder, "size_mb": cache_size_mb}
+        except Exception as e:
+            print(f"\033[91mNie udało się utworzyć folderu {cache_folder}: {e}\033[0m")
+
+    # Parametry obróbki pojedynczego pliku (przekazywane także do procesów roboczych)
+    settings = {
+        "offset_raw": offset_raw,
+        "erase_peak": erase_peak,
+        "invert_peak": invert_peak,
+        "default_window_length_u": default_window_length_u,
+        "default_window_length_pd": default_window_length_pd,
+        "min_sample": min_sample,
+        "max_sample": max_sample
+    }
 
     # Nowe zmienne do numerowania i śledzenia postępu
-    files_to_process = [f for f in os.listdir(folder_path) if f.endswith(".txt") or f.endswith(".csv")]
-    total_files = len(files_to_process)
+    file_paths, missing_paths = resolve_input_paths(args.paths)
+    total_files = len(file_paths)
     processed_files = 0
     success_files = 0
+    if total_files == 0:
+        print("\033[38;5;214mBrak plików .txt lub .csv do wczytania \033[0m")
 
-    for idx, filename in enumerate(files_to_process, start=1):
-        file_path = os.path.join(folder_path, filename)
-        print(f"\n[{idx}/{total_files}] Plik: {filename} ...")
-        data, tribometer_type, mode = read_and_process_file(file_path) # Wczytaj dane z plików
-        # print(f"[1/5] done reading file")
-        processed_files += 1
-        if data is not None:
-            # Przetwórz dane przy użyciu najlepszej wartości sample_average (do wyboru µ lub pd)
-            best_sample_average_µ, best_sample_average_pd = find_optimal_samples_average(data, column_names=['Distance [m]', 'µ', 'Penetration Depth [µm]'], min_sample=min_sample, max_sample=max_sample)
-            # print(f"[2/5] done finding optimal samples average")
-            averaged_data = adjust_and_average_data(data, best_sample_average_µ, default_window_length_u, default_window_length_pd)
-            # print(f"[3/5] done adjusting and averaging data")
-            # Korekta zużycia liniowego (df=averaged_data, data=data, percent=0.05, offset_raw=0, erase_peak=0, invert_peak=1)
-            averaged_data = process_penetration_depth(averaged_data, data, 0.05, offset_raw, erase_peak, invert_peak)
-            # print(f"[4/5] done processing penetration depth")
-            # Approximate the last value
-            approximated_data = approximate_last_measurement(averaged_data, data)
-            # print(f"[5/5] done approximating last measurement")
-            # Nazwa plików CSV odpowiadających nazwie pliku tekstowego oryginalnego + spacja
-            output_file = os.path.splitext(filename)[0] + ' .csv'
-            output_file_raw = "raw_" + output_file # to samo co wyżej, ale z przedrostkiem "raw_"
-
-            # Umieść pliki wynikowe w katalogu tymczasowym
-            temp_output_file = os.path.join(temp_folder, output_file)
-            temp_output_file_raw = os.path.join(temp_folder, output_file_raw)
-            
-            if "Nano" in tribometer_type: # "Nano" - usuń kolumnę pd dla nano tribometru
-                approximated_data = approximated_data.drop(columns=['Penetration Depth [µm]']) # z obrobionych
-                data = data.drop(columns=['Penetration Depth [µm]']) # z raw
+    # Pasek postępu tylko w konsoli (bez przekierowania stderr do pliku i bez -q)
+    progress = progress_bar() if progress_mode == 1 and not args.quiet and sys.stderr.isatty() else None
 
-            # Zapisz wynik do pliku CSV w temp_folder
-            try:
-                approximated_data.to_csv(temp_output_file, index=False, float_format='%.4f') # finalne dane wyjściowe
-                data.to_csv(temp_output_file_raw, index=False, float_format='%.4f') # dane tylko wstępnie obrobione
-                csv_files.append(temp_output_file)
-                csv_files_raw.append(temp_output_file_raw)
-                success_files += 1
-
-                # Calculate and print the mean value for µ data column
-                if "µ" in approximated_data.columns:
-                    mu_mean = approximated_data["µ"].mean()
-                else:
-                    mu_mean = float('nan')
-                print(f"[{tribometer_type}][{mode}] Wartość średnia dla 'µ': {mu_mean:.3f}")
-            except Exception as e:
-                print(f"\033[91mBłąd podczas zapisywania pliku {output_file}: {e} \033[0m")
+    # Stan plików przed obróbką (tryb obserwowania folderu wykrywa późniejsze zmiany)
+    snapshots = {file_path: file_signature(file_path) for file_path in file_paths}
+    file_results = {}
+    for idx, result in enumerate(process_files(file_paths, settings, workers, temp_folder, cache, profile, progress), start=1):
+        processed_files += 1
+        file_results[file_paths[idx - 1]] = result
+        if result["data"] is not None:
+            success_files += 1
         else:
-            print(f"\033[91m[{idx}/{total_files}] Plik: {filename} NIE ZOSTAŁ POPRAWNIE PRZETWORZONY\033[0m")
+            print(f"\033[91m[{idx}/{total_files}] Plik: {result['filename']} NIE ZOSTAŁ POPRAWNIE PRZETWORZONY\033[0m")
             
-    # Generowanie pliku xlsx ze wszystkimi danymi
-    status = 0
-    if csv_files or csv_files_raw: print("Generowanie pliku Excelowskiego ...")
-    if csv_files:
-        try:
-            generate_combined_xlsx(csv_files, "combined_data.xlsx", title_from_text, chart_lang)
-            status = 1
-        except Exception as e:
-            status = 0
-            print(f"\033[91mBłąd podczas zapisywania pliku combined_data.xlsx: {e} \033[0m")
-        if csv_files and csv_files_raw:
-            try:
-                generate_combined_xlsx_2(csv_files, csv_files_raw, "combined_data_all.xlsx", title_from_text, chart_lang)
-                status = 1
-            except Exception as e:
-                status = 0
-                print(f"\033[91mBłąd podczas zapisywania pliku combined_data_all.xlsx: {e} \033[0m")
-
-    if csv_files_raw:
-        try:
-            generate_combined_xlsx(csv_files_raw, "combined_data_raw.xlsx", title_from_text, chart_lang)
-            status = 1
-        except Exception as e:
-            status = 0
-            print(f"\033[91mBłąd podczas zapisywania pliku combined_data_raw.xlsx: {e} \033[0m")
-
-    # Usuwanie całego folderu tymczasowego razem ze wszystkimi plikami w środku
-    try:
-        if os.path.exists(temp_folder):
-            shutil.rmtree(temp_folder)
-            print(f"Wszystkie pliki tymczasowe oraz folder {temp_folder} zostały usunięte.")
-    except Exception as e:
-        print(f"\033[91mBłąd podczas usuwania folderu tymczasowego {temp_folder}: {e}\033[0m")
+    # Generowanie plików xlsx ze wszystkimi danymi (jedno przejście po wynikach)
+    workbook_options = {"title_from_text": title_from_text, "chart_lang": chart_lang, "stream_raw_xlsx": stream_raw_xlsx, "chart_points": chart_points, "output_dir": output_dir}
+    workbook_stages = [] if profile > 0 else None
+    if profile > 0:
+        start_profiling(memory=profile == 2)
+    with profile_stage(workbook_stages, "write_workbooks", sum(len(result["data_raw"]) for result in file_results.values() if result["data"] is not None)):
+        status = write_workbooks(list(file_results.values()), **workbook_options)
+
+    # Pomiary etapów obróbki: tabela i plik Chrome trace (profile = 1 lub 2)
+    if profile > 0:
+        file_records = [(result["filename"], result.get("stages") or []) for result in file_results.values()]
+        file_records.append(("xlsx", workbook_stages))
+        print_profile_summary(file_records)
+        write_chrome_trace(output_path(output_dir, "profile_trace.json"), file_records)
+
+    # Zapis wyników każdego pliku w formacie kolumnowym (export_arrays = 1)
+    arrays_folder = None
+    if export_arrays_mode == 1:
+        arrays_folder = output_path(output_dir, ARRAYS_FOLDER)
+        parquet = parquet_available()
+        for result in file_results.values():
+            export_arrays(result, arrays_folder, parquet)
+        print(f"Dane zostały zapisane do folderu {arrays_folder} (.npy{', .parquet' if parquet else ''})")
+
+    # Pliki CSV zostają w folderze (keep_csv = 1)
+    if temp_folder is not None:
+        print(f"Pliki CSV zostały zachowane w folderze {temp_folder}.")
 
     print(f"POPRAWNIE przetworzono {success_files} z {total_files} plików.")
 
     if status == 1: print(f"\033[92mWszystkie dane z WCZYTANYCH {success_files} z {total_files} plików zostały zapisane poprawnie \033[0m")
-    else: print("\033[91mNie wszystkie dane zostały zapisane poprawnie z powodu powyższych błędów \033[0m")
-
-    # Odliczanie do zamknięcia konsoli
-    countdown = 5
-    while countdown > 0:
-        print(f"Okno konsoli zostanie zamknięte za {countdown} s, naciśnij ESC by anulować zamknięcie", end="\r")  # Wyświetl odliczanie w tej samej linii
-        if msvcrt.kbhit() and msvcrt.getch() == b'\x1b':  # Sprawdź, czy naciśnięto klawisz Escape
-            print("\n Anulowano zamknięcie, teraz naciśnij dowolny klawisz, aby zamknąć konsolę.")
-            msvcrt.getch()  # Czeka na naciśnięcie dowolnego klawisza
-        time.sleep(1)
-        countdown -= 1
+    elif total_files > 0: print("\033[91mNie wszystkie dane zostały zapisane poprawnie z powodu powyższych błędów \033[0m")
+
+    # Tryb ciągły - obróbka nowych lub zmienionych plików do przerwania (Ctrl+C)
+    if watch == 1:
+        watch_folder(args.paths[0], file_results, snapshots, watch_interval, settings, workers, temp_folder, cache, workbook_options, arrays_folder, progress)
+        file_paths = list(file_results)
+        total_files = len(file_paths)
+        success_files = sum(1 for result in file_results.values() if result["data"] is not None)
+    # Odliczanie do zamknięcia konsoli (tylko tryb interaktywny w Windows)
+    elif not headless and os.name == "nt":
+        countdown = 5
+        while countdown > 0:
+            print(f"Okno konsoli zostanie zamknięte za {countdown} s, naciśnij ESC by anulować zamknięcie", end="\r")  # Wyświetl odliczanie w tej samej linii
+            if msvcrt.kbhit() and msvcrt.getch() == b'\x1b':  # Sprawdź, czy naciśnięto klawisz Escape
+                print("\n Anulowano zamknięcie, teraz naciśnij dowolny klawisz, aby zamknąć konsolę.")
+                msvcrt.getch()  # Czeka na naciśnięcie dowolnego klawisza
+            time.sleep(1)
+            countdown -= 1
+
+    # Podsumowanie (kod wyjścia i --json): bez zapisanych plików xlsx wszystkie pliki są niepoprawne,
+    # nieznalezione ścieżki z argumentów (np. literówka w zadaniu harmonogramu) też są błędem
+    workbooks = [output_path(output_dir, name) for name in ("combined_data.xlsx", "combined_data_all.xlsx", "combined_data_raw.xlsx")]
+    return {
+        "version": __version__,
+        "files": [{"file": file_path, "processed": file_results[file_path]["data"] is not None} for file_path in file_paths if file_path in file_results],
+        "total": total_files,
+        "processed": success_files,
+        "missing": missing_paths,
+        "failed": (total_files - success_files if status == 1 else total_files) + len(missing_paths),
+        "workbooks": workbooks if status == 1 else []
+    }
 
 if __name__ == "__main__":
-    main()
+    multiprocessing.freeze_support() # Procesy robocze w wersji skompilowanej (pyinstaller)
+    sys.exit(main())
 
-# TODO dodać komunikat że nie ma plików do wczytania (pusty folder)
 # TODO poprawić komunikat braku zmiennych w nazwie pliku (usunąć nawias kwadratowy i standardowe zmienne 0.1m/s i 10N)
-# TODO dodać procent przetwarzania danych
-# TODO zunifikować funkcję generate_combined_xlsx i generate_combined_xlsx_2
@@ -0,0 +1,223 @@
+# Benchmark etapów obróbki na syntetycznych danych we wszystkich formatach rozpoznawanych przez read_and_process_file
+#
+# Generatory tworzą pliki jak z tribometrów: Nano (Linear, Rotary), TRB3 (Linear, Rotary), T11 (separator ";",
+# przecinek dziesiętny) i Rtec, z wstrzykniętymi peakami, powtarzającymi się wartościami (zawieszony czujnik),
+# zmianami kierunku ruchu (tryb Linear) i opcjonalnie niepoprawnymi wierszami. Mierzony jest czas każdego etapu
+# obróbki tak jak w programie (process_file z pomiarem etapów, profile = 1): read_and_process_file,
+# find_optimal_samples_average, adjust_and_average_data, process_penetration_depth, approximate_last_measurement,
+# round_decimals oraz zapis plików xlsx (generate_combined_workbooks).
+# Wynik w pliku JSON, porównanie z poprzednim raportem: --compare.
+#
+# Użycie:
+#   python benchmarks/pipeline.py
+#   python benchmarks/pipeline.py --rows 10000 1000000 10000000 --formats t11 rtec --json wynik.json
+#   python benchmarks/pipeline.py --data-dir bench_data --compare poprzedni.json
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "_TriboReader1.76.py")
+EXCEL_MAX_ROWS = 1048576 - 3 # Limit wierszy arkusza (nagłówki w wierszach 1-3)
+CHUNK_ROWS = 1000000 # Pliki generowane i zapisywane w częściach
+
+NANO_COLUMNS = "Time [s]\tDistance [m]\tlaps\tSequence ID\tCycle ID\tMax linear speed [m/s]\tNominal Load [mN]\tµ\t{}\tNormal force [mN]\tFriction force [mN]\tPenetration depth [µm]"
+TRB3_COLUMNS = "Time [s]\tDistance [m]\tLaps\tSequence ID\tCycle ID\tMax Linear Speed [m/s]\tNominal Load [N]\tµ\t{}\tFriction Force [N]\tTemperature [°C]\tHumidity [%]\tPenetration Depth [µm]"
+
+# Formaty plików: nagłówek przed danymi, separator, przecinek dziesiętny, separator na końcu linii, nazwa pliku
+# (prędkość i obciążenie w nazwie dla T11 i Rtec, {limit} - limit drogi, patrz file_name) oraz kolumny:
+# czas, droga, µ, pozycja liniowa, zużycie liniowe
+FORMATS = {
+    "nano_lin": {"preamble": "Nano Tribometer\nLinear mode\n", "header": NANO_COLUMNS.format("Linear Position [mm]"), "sep": "\t", "decimal": ".",
+                 "trailing": False, "name": "nano lin (A).txt", "time": 0, "distance": 1, "mu": 7, "position": 8, "depth": 11},
+    "nano_rot": {"preamble": "Nano Tribometer\nSingle-way mode\n", "header": NANO_COLUMNS.format("Angle [°]"), "sep": "\t", "decimal": ".",
+                 "trailing": False, "name": "nano rot (B).txt", "time": 0, "distance": 1, "mu": 7, "depth": 11},
+    "trb3_lin": {"preamble": "TRB3\nLinear mode\n", "header": TRB3_COLUMNS.format("Linear Position [mm]"), "sep": "\t", "decimal": ".",
+                 "trailing": False, "name": "trb3 lin (C).txt", "time": 0, "distance": 1, "mu": 7, "position": 8, "depth": 12},
+    "trb3_rot": {"preamble": "TRB3\nSingle-way mode\n", "header": TRB3_COLUMNS.format("Angle [°]"), "sep": "\t", "decimal": ".",
+                 "trailing": False, "name": "trb3 rot (D).txt", "time": 0, "distance": 1, "mu": 7, "depth": 12},
+    "t11": {"preamble": "T11\n", "header": "Time [s];Friction force [N];Displacement [um];Temperature2 [C];Temperature1 [C];Rotational speed [rpm];Number of revolutions",
+            "sep": ";", "decimal": ",", "trailing": True, "name": "t11 0.1m-s 10N (E).csv", "time": 0, "force": 1, "depth": 2},
+    "rtec": {"preamble": "Rtec\n", "header": "Step, Timestamp, RecipeStep, DAQ.Fz (N),DAQ.Fx (N),DAQ.COF (),Rotary.Velocity (rpm),XYZ.Z Depth (mm),XYZ.Z Position (mm),Rotary.Angle (deg),",
+             "sep": ",", "decimal": ".", "trailing": True, "name": "rtec {limit}m 0.2m-s (F).csv", "time": 1, "mu": 5, "position_mm": 8},
+}
+
+RTEC_SPEED = 0.2 # m/s, jak w nazwie pliku Rtec
+
+# Nazwa pliku dla liczby wierszy: Rtec z limitem drogi powyżej drogi z danych (0.1 s na wiersz), bez niego
+# program przyjmuje limit z nazwy (np. "2m" z "0.2m-s") lub domyślny 1000 m i odrzuca większość wierszy
+def file_name(kind, rows):
+    return FORMATS[kind]["name"].format(limit=int(rows * 0.1 * RTEC_SPEED) + 1000)
+
+# Moduł programu (nazwa pliku z kropką - import przez importlib)
+# Moduły ładowane przez program przy pierwszym użyciu importowane od razu, aby nie wliczać ich do etapów
+def load_program():
+    spec = importlib.util.spec_from_file_location("triboreader_benchmark", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    import scipy.signal
+    import xlsxwriter
+    return module
+
+# Jedna część danych (wiersze start..start+count z rows) dla formatu
+def generate_chunk(spec, start, count, rows, rng):
+    column_count = len(spec["header"].rstrip(spec["sep"]).split(spec["sep"]))
+    data = rng.normal(0, 1, (count, column_count))
+    t = (start + np.arange(count)) * 0.1 # 10 Hz
+    data[:, spec["time"]] = t
+    mu = 0.3 + 0.05 * np.sin(t / 50) + rng.normal(0, 0.01, count)
+    depth = -3 + np.sqrt(t) * 0.5 + rng.normal(0, 0.2, count)
+    peaks = rng.random(count) < 0.001 # Peaki: 0.1% wierszy
+    stuck = rng.random(count) < 0.12 # Zawieszony czujnik: ta sama wartość w 12% wierszy
+    if "distance" in spec:
+        data[:, spec["distance"]] = t * 0.01
+    if "position" in spec:
+        # Ruch posuwisto-zwrotny: znak µ zmienia się przy każdej zmianie kierunku ruchu
+        # (ostatnie 100 wierszy bez zmiany kierunku - zatrzymanie na końcu testu)
+        phase = t * 2
+        moving = (start + np.arange(count)) < rows - 100
+        data[:, spec["position"]] = np.where(moving, 5 * np.sin(phase), 5.5)
+        mu = np.where(np.cos(phase) >= 0, mu, -mu)
+        mu[~moving] = np.abs(mu[~moving])
+        mu[peaks] = 9.0
+    else:
+        mu[peaks] = 9.0
+        mu[stuck] = 0.111
+    if "mu" in spec:
+        data[:, spec["mu"]] = mu
+    if "force" in spec:
+        data[:, spec["force"]] = np.abs(mu) * 10 # T11: siła tarcia przy obciążeniu 10 N
+    if "depth" in spec:
+        data[:, spec["depth"]] = depth
+    if "position_mm" in spec:
+        data[:, spec["position_mm"]] = -0.01 + depth / 1000
+    return data
+
+# Plik syntetyczny z rows wierszami danych (zapis w częściach), bad_rows - dwa niepoprawne wiersze na początku
+def generate_file(kind, rows, path, seed=0, bad_rows=False):
+    spec = FORMATS[kind]
+    sep = spec["sep"]
+    line_end = (sep if spec["trailing"] else "") + "\r\n"
+    column_count = len(spec["header"].rstrip(sep).split(sep))
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        file.write("﻿" + spec["preamble"] + spec["header"] + "\r\n")
+        if bad_rows:
+            file.write(sep.join(["x"] * column_count) + line_end) # Niepoprawny wiersz (tekst)
+            file.write("1" + sep + "2" + line_end) # Niepoprawny wiersz (za mało kolumn)
+        for start in range(0, rows, CHUNK_ROWS):
+            count = min(CHUNK_ROWS, rows - start)
+            data = generate_chunk(spec, start, count, rows, np.random.default_rng([seed, start]))
+            pd.DataFrame(data).to_csv(file, sep=sep, header=False, index=False, float_format="%.6f",
+                                      decimal=spec["decimal"], lineterminator=line_end)
+
+# Czas wywołania funkcji (komunikaty programu pomijane)
+def timed(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        value = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    return value, elapsed
+
+# Obróbka jednego pliku przez process_file, czasy etapów z jego pomiarów (profile = 1)
+# Wczytane dane muszą mieć prawie tyle wierszy co plik - inaczej etapy byłyby mierzone na odrzuconych danych
+def run_pipeline(program, path, settings, rows):
+    result, _ = timed(program.process_file, path, settings, profile=1)
+    if not result["processed"]:
+        raise RuntimeError(f"Nie przetworzono pliku {path}")
+    stages = {record["stage"]: record["wall_s"] for record in result["stages"]}
+    read_rows = next(record["rows_out"] for record in result["stages"] if record["stage"] == "read_and_process_file")
+    assert read_rows >= 0.99 * rows, f"{path}: wczytano {read_rows} z {rows} wierszy"
+    return stages, result["data"], result["data_raw"]
+
+# Porównanie z poprzednim raportem: stosunek czasów (poprzedni / obecny, > 1 - szybciej)
+def compare_reports(previous, current):
+    before = {(entry["format"], entry["rows"]): entry for entry in previous["results"]}
+    print("\nPorównanie z poprzednim raportem (przyspieszenie = poprzedni / obecny):")
+    for entry in current["results"]:
+        old = before.get((entry["format"], entry["rows"]))
+        if old is None:
+            continue
+        ratios = [f"{stage} {old['stages'][stage] / seconds:5.2f}x" for stage, seconds in entry["stages"].items()
+                  if stage in old["stages"] and seconds > 0]
+        print(f"{entry['format']:>9} {entry['rows']:>9}: razem {old['total_s'] / entry['total_s']:5.2f}x | " + ", ".join(ratios))
+    old_xlsx = {entry["rows"]: entry for entry in previous.get("xlsx", [])}
+    for entry in current["xlsx"]:
+        old = old_xlsx.get(entry["rows"])
+        if old is not None and entry.get("seconds") and old.get("seconds"):
+            print(f"{'xlsx':>9} {entry['rows']:>9}: {old['seconds'] / entry['seconds']:5.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark etapów obróbki TriboReader na danych syntetycznych.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000], help="liczby wierszy danych (np. 10000 do 10000000)")
+    parser.add_argument("--formats", nargs="+", choices=sorted(FORMATS), default=list(FORMATS), help="formaty plików")
+    parser.add_argument("--data-dir", help="folder na pliki syntetyczne (zachowywane i używane ponownie), domyślnie folder tymczasowy")
+    parser.add_argument("--seed", type=int, default=0, help="ziarno generatora")
+    parser.add_argument("--bad-rows", action="store_true", help="niepoprawne wiersze w plikach (wolniejsza ścieżka wczytywania)")
+    parser.add_argument("--stream", action="store_true", help="zapis xlsx RAW strumieniowo (stream_raw_xlsx = 1)")
+    parser.add_argument("--no-xlsx", action="store_true", help="bez pomiaru zapisu plików xlsx")
+    parser.add_argument("--json", default="benchmark_pipeline.json", help="plik raportu JSON")
+    parser.add_argument("--compare", help="poprzedni raport JSON do porównania")
+    args = parser.parse_args()
+
+    program = load_program()
+    settings = {"offset_raw": 1, "erase_peak": 0, "invert_peak": 1, "default_window_length_u": 7,
+                "default_window_length_pd": 5, "min_sample": 100, "max_sample": 110}
+    report = {"version": program.__version__, "python": sys.version.split()[0], "platform": platform.platform(),
+              "date": time.strftime("%Y-%m-%d %H:%M:%S"), "seed": args.seed, "bad_rows": int(args.bad_rows), "settings": settings, "stream_raw_xlsx": int(args.stream),
+              "results": [], "xlsx": []}
+
+    with contextlib.ExitStack() as stack:
+        data_dir = args.data_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        for rows in args.rows:
+            folder = os.path.join(data_dir, f"{rows}_bad" if args.bad_rows else str(rows))
+            os.makedirs(folder, exist_ok=True)
+            results, results_raw = [], []
+            for kind in args.formats:
+                path = os.path.join(folder, file_name(kind, rows))
+                if not os.path.isfile(path):
+                    start = time.perf_counter()
+                    generate_file(kind, rows, path, args.seed, args.bad_rows)
+                    print(f"Wygenerowano {path} ({time.perf_counter() - start:.1f} s)")
+                stages, processed, raw = run_pipeline(program, path, settings, rows)
+                total = sum(stages.values())
+                entry = {"format": kind, "rows": rows, "file_mb": round(os.path.getsize(path) / 2 ** 20, 2),
+                         "stages": {stage: round(seconds, 4) for stage, seconds in stages.items()},
+                         "total_s": round(total, 4), "rows_per_s": round(rows / total) if total > 0 else None}
+                report["results"].append(entry)
+                print(f"{kind:>9} {rows:>9}: {total:8.3f} s ({entry['rows_per_s']} wierszy/s) | "
+                      + ", ".join(f"{stage} {seconds:.3f}" for stage, seconds in stages.items()))
+                name = os.path.splitext(file_name(kind, rows))[0] + " .csv"
+                results.append((name, processed))
+                results_raw.append(("raw_" + name, raw))
+
+            if args.no_xlsx:
+                continue
+            if max(len(raw) for _, raw in results_raw) > EXCEL_MAX_ROWS:
+                report["xlsx"].append({"rows": rows, "seconds": None, "skipped": "limit wierszy arkusza Excela"})
+                print(f"{'xlsx':>9} {rows:>9}: pominięto (limit wierszy arkusza Excela)")
+                continue
+            with tempfile.TemporaryDirectory() as output:
+                outputs = [os.path.join(output, name) for name in ("combined_data.xlsx", "combined_data_all.xlsx", "combined_data_raw.xlsx")]
+                _, seconds = timed(program.generate_combined_workbooks, results, results_raw, 1, "en", int(args.stream), 0, *outputs)
+            report["xlsx"].append({"rows": rows, "seconds": round(seconds, 4)})
+            print(f"{'xlsx':>9} {rows:>9}: {seconds:8.3f} s (generate_combined_workbooks)")
+
+    with open(args.json, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Raport zapisano do pliku {args.json}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            compare_reports(json.load(file), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Pomiar czasu startu programu: skrypt .py i wersja skompilowana (pyinstaller), start zimny i ciepły
+#
+# Program jest uruchamiany w trybie wsadowym na pustym folderze (bez plików do wczytania) - mierzony jest czas
+# od uruchomienia procesu do jego zakończenia, czyli koszt startu, wczytania configu i wyszukania plików.
+# Pierwsze uruchomienie to start zimny (dla pyinstaller --onefile także rozpakowanie), kolejne to start ciepły.
+# Prawdziwie zimny start wymaga pustej pamięci podręcznej systemu plików: opcja --drop-caches (Linux, root).
+# Dla skryptu .py sprawdzane jest też, czy moduły numpy, pandas, scipy i xlsxwriter nie są importowane przy starcie.
+#
+# Użycie:
+#   python benchmarks/startup.py
+#   python benchmarks/startup.py --exe dist/_TriboReader1.76.exe --repeat 20 --max-warm-ms 1000 --json startup.json
+# Kod wyjścia 1, gdy mediana startu ciepłego przekracza --max-warm-ms lub przy starcie ładowane są ciężkie moduły.
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "_TriboReader1.76.py")
+HEAVY_MODULES = ("numpy", "pandas", "scipy", "xlsxwriter")
+
+# Opróżnienie pamięci podręcznej systemu plików (tylko Linux z uprawnieniami root)
+def drop_caches():
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as file:
+            file.write("3\n")
+        return True
+    except OSError:
+        return False
+
+# Czas jednego uruchomienia w milisekundach
+def run_once(command, cwd):
+    start = time.perf_counter()
+    completed = subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    elapsed = (time.perf_counter() - start) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} zakończone kodem {completed.returncode}")
+    return elapsed
+
+# Start zimny (pierwsze uruchomienie) i ciepły (mediana kolejnych) dla jednego polecenia
+def measure(name, command, repeat, cold_drop):
+    with tempfile.TemporaryDirectory() as folder:
+        command = command + ["-q", folder]
+        dropped = drop_caches() if cold_drop else False
+        cold = run_once(command, folder)
+        warm = [run_once(command, folder) for _ in range(repeat)]
+    result = {
+        "name": name,
+        "cold_ms": round(cold, 1),
+        "cold_caches_dropped": dropped,
+        "warm_median_ms": round(statistics.median(warm), 1),
+        "warm_min_ms": round(min(warm), 1),
+        "warm_max_ms": round(max(warm), 1),
+        "repeat": repeat
+    }
+    print(f"{name:>8}: zimny {result['cold_ms']:8.1f} ms, ciepły mediana {result['warm_median_ms']:8.1f} ms "
+          f"(min {result['warm_min_ms']:.1f}, max {result['warm_max_ms']:.1f}, n={repeat})")
+    return result
+
+# Moduły ciężkie zaimportowane przy starcie skryptu na pustym folderze (python -X importtime)
+def heavy_imports_at_startup():
+    with tempfile.TemporaryDirectory() as folder:
+        completed = subprocess.run([sys.executable, "-X", "importtime", SCRIPT, "-q", folder], cwd=folder,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imported = set()
+    for line in completed.stderr.splitlines():
+        module = line.rsplit("|", 1)[-1].strip()
+        if module.split(".")[0] in HEAVY_MODULES:
+            imported.add(module.split(".")[0])
+    return sorted(imported)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pomiar czasu startu TriboReader (.py i wersja skompilowana).")
+    parser.add_argument("--exe", help="wersja skompilowana (domyślnie dist/_TriboReader1.76.exe lub dist/_TriboReader1.76, gdy istnieje)")
+    parser.add_argument("--repeat", type=int, default=10, help="liczba uruchomień dla startu ciepłego")
+    parser.add_argument("--drop-caches", action="store_true", help="opróżnienie pamięci podręcznej systemu plików przed startem zimnym")
+    parser.add_argument("--max-warm-ms", type=float, help="próg regresji dla mediany startu ciepłego")
+    parser.add_argument("--json", help="zapis wyników do pliku JSON")
+    args = parser.parse_args()
+
+    exe = args.exe
+    if exe is None:
+        for candidate in ("_TriboReader1.76.exe", "_TriboReader1.76"):
+            if os.path.isfile(os.path.join(ROOT, "dist", candidate)):
+                exe = os.path.join(ROOT, "dist", candidate)
+                break
+
+    report = {"python": sys.version.split()[0], "platform": platform.platform(), "results": []}
+    report["results"].append(measure(".py", [sys.executable, SCRIPT], args.repeat, args.drop_caches))
+    if exe is not None:
+        report["results"].append(measure("frozen", [os.path.abspath(exe)], args.repeat, args.drop_caches))
+    else:
+        print("  frozen: pominięto (brak wersji skompilowanej, opcja --exe)")
+    report["heavy_imports"] = heavy_imports_at_startup()
+    print(f"Moduły ciężkie importowane przy starcie: {', '.join(report['heavy_imports']) or 'brak'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    failed = bool(report["heavy_imports"])
+    if args.max_warm_ms is not None:
+        for result in report["results"]:
+            if result["warm_median_ms"] > args.max_warm_ms:
+                print(f"REGRESJA: {result['name']} ciepły start {result['warm_median_ms']} ms > {args.max_warm_ms} ms")
+                failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
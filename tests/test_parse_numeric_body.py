@@ -0,0 +1,63 @@
+# Testy walidacji wierszy danych (parse_numeric_body): liczba kolumn jak w nagłówku, separatory na końcu linii
+# Uruchomienie: python -m pytest -q tests
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import triboreader
+
+# Poprawny wiersz T11 (7 kolumn, przecinek dziesiętny) i wiersz Rtec (10 kolumn)
+T11_ROW = "{};3,045;-4,9;0,1049;-0,5357;0,3616;1,304"
+RTEC_ROW = "1,{},1,10.0,3.0,0.3,60,0.0,-0.01,5.0"
+
+def read(header, rows, sep):
+    data = "T11 export\r\n" if sep == ";" else "Rtec\r\n"
+    data += header + "\r\n" + "".join(row + "\r\n" for row in rows)
+    _, values, valid_rows, invalid_rows = triboreader.read_tribometer_data(io.BytesIO(data.encode("utf-8")))
+    return values, valid_rows, invalid_rows
+
+def t11_rows(count):
+    return [T11_ROW.format(f"{i / 10:.1f}".replace(".", ",")) + ";" for i in range(count)]
+
+def rtec_rows(count):
+    return [RTEC_ROW.format(i / 10) + "," for i in range(count)]
+
+# Za szeroki pierwszy wiersz (puste pola, potem liczba): odrzucony tylko ten wiersz, bez skrócenia go do liczby kolumn
+# i bez przesunięcia kolejnych wierszy (nadmiarowe pola jako indeks)
+@pytest.mark.parametrize("header, rows, sep", [
+    (triboreader.T11_HEADER, t11_rows(30), ";"),
+    (triboreader.RTEC_HEADER, rtec_rows(40), ","),
+])
+def test_too_wide_first_row(header, rows, sep):
+    rows[0] = rows[0] + sep + sep + "8"
+    values, valid_rows, invalid_rows = read(header, rows, sep)
+    assert (valid_rows, invalid_rows) == (len(rows) - 1, 1)
+    assert values[0, 0] == 0.1
+
+# Za szeroki wiersz w środku pliku (puste pola, potem liczba): odrzucony, a nie skrócony do liczby kolumn nagłówka
+@pytest.mark.parametrize("header, rows, sep", [
+    (triboreader.T11_HEADER, t11_rows(30), ";"),
+    (triboreader.RTEC_HEADER, rtec_rows(40), ","),
+])
+def test_too_wide_middle_row(header, rows, sep):
+    rows[10] = rows[10] + sep + sep + "8"
+    values, valid_rows, invalid_rows = read(header, rows, sep)
+    assert (valid_rows, invalid_rows) == (len(rows) - 1, 1)
+    assert 1.0 not in values[:, 0]
+
+# Dowolna liczba separatorów na końcu linii jest dozwolona (jak rstrip(sep)), pole ze spacją już nie
+def test_trailing_separators():
+    rows = t11_rows(3)
+    rows[0] += ";;;"
+    rows[1] += " ;"
+    _, valid_rows, invalid_rows = read(triboreader.T11_HEADER, rows, ";")
+    assert (valid_rows, invalid_rows) == (2, 1)
+
+# Liczba linii i pól w najdłuższej linii, także gdy linia przechodzi przez granicę bloku
+def test_count_data_rows():
+    data = b"header\n1;2;3\n1;2;3;;;\n1;2"
+    for block_size in (1, 3, 64):
+        assert triboreader.count_data_rows(data, 7, ";", block_size=block_size) == (3, 6)
@@ -0,0 +1,15 @@
+# Import programu jako modułu (nazwa pliku z wersją nie pozwala na zwykły import), np. w usłudze akwizycji:
+#   import triboreader
+#   result = triboreader.process_data(data_bytes, file_name="rtec 1000m 0.2m-s (F).csv")
+#   result["processed"]["µ"], result["diagnostics"]
+import os
+import sys
+import importlib.util
+
+PROGRAM_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_TriboReader1.76.py")
+
+# Moduł programu zastępuje ten moduł w sys.modules (także dla procesów roboczych i pickle)
+spec = importlib.util.spec_from_file_location(__name__, PROGRAM_PATH)
+module = importlib.util.module_from_spec(spec)
+sys.modules[__name__] = module
+spec.loader.exec_module(module)